@@ -1,17 +1,36 @@
 import re
 import time
+import asyncio
+import base64
 import io
+import json
+import contextlib
+import functools
+import hashlib
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import threading
+from concurrent.futures import Future
 from typing import Any, Dict
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import MemorySaver
-from langchain_core.tools import tool
+from langchain_core.tools import StructuredTool, tool
+from langchain_core.caches import InMemoryCache
+from langchain_core.globals import set_llm_cache
 from dotenv import load_dotenv
 from duckduckgo_search import DDGS
 
+import httpx
+import lxml.html
+from lxml import etree
 import requests
-import pdfplumber
+import urllib3
 import undetected_chromedriver as uc
+from selenium.common.exceptions import JavascriptException, StaleElementReferenceException, TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait, Select
 from selenium.webdriver.support import expected_conditions as EC
@@ -20,25 +39,125 @@ import random
 import string
 from faker import Faker  # For realistic random data
 
+# PyMuPDF is much faster than pdfplumber for plain text; keep pdfplumber as a fallback
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+    import pdfplumber
+    from pdfminer.high_level import extract_text as pdfminer_extract_text
+
+# pypdf only extracts text, without pdfplumber's layout analysis, so it is tried before
+# pdfplumber when PyMuPDF is missing
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# pdfminer logs every token at DEBUG level, which slows parsing dramatically under verbose configs
+logging.getLogger("pdfminer").setLevel(logging.WARNING)
+logging.getLogger("pdfplumber").setLevel(logging.WARNING)
+
+# Poppler's pdftotext is faster than any Python parser when it is on the PATH
+PDFTOTEXT = shutil.which("pdftotext")
+
+# Above this size pdfplumber spends most of its time building objects for drawing operators,
+# so the fallback path switches to pdfminer's plain text converter
+LARGE_PDF_BYTES = 5 * 1024 * 1024
+
+# Downloads are streamed and aborted once they exceed this size
+MAX_PDF_BYTES = 50 * 1024 * 1024
+
+# A PDF's %PDF header must appear within its first kilobyte; anything else, typically an
+# HTML error or login page, is rejected before the rest of the body is downloaded
+PDF_MAGIC = b"%PDF"
+PDF_HEADER_BYTES = 1024
+
+# Extracted PDF text kept between runs, as <sha256 of the PDF>.txt, so the same document is
+# only extracted once whatever URL it came from. <sha256 of the URL>.json records the
+# ETag/Last-Modified and content hash of a URL's last download for conditional requests.
+# Paths from .env are expanded here, since python-dotenv leaves a leading ~ as is.
+PDF_CACHE_DIR = os.path.expanduser(os.getenv("CRAWLER_PDF_CACHE_DIR", os.path.join("~", ".cache", "crawler", "pdf")))
+
+# Most extra browsers opened to look up several HS codes side by side
+TARIFF_LOOKUP_WORKERS = 3
+
+# Most browsers web_scraper keeps for reading pages, so parallel tool calls each get one
+SCRAPER_POOL_SIZE = 2
+
+# Debug output such as per-step screenshots is opt-in, since it slows every lookup
+CRAWLER_DEBUG = os.getenv("CRAWLER_DEBUG", "").lower() in ("1", "true", "yes")
+
 fake = Faker()
 
 load_dotenv()
 
+# Identical prompts within a session are answered from memory instead of another API call
+set_llm_cache(InMemoryCache())
+
+# One pooled session for the tools' plain HTTP downloads, so repeated fetches reuse
+# keep-alive connections instead of a new TCP/TLS handshake each
+http_session = requests.Session()
+http_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16))
+http_session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
 # --------------------------------------------------------------------------------
 # Browser Class
 # --------------------------------------------------------------------------------
+# Size of the HTTP connection pool to chromedriver; Selenium's default of 1 serializes
+# overlapping WebDriver commands
+SELENIUM_POOL_MAXSIZE = 20
+
+# Requests Chrome drops at the network layer: images, fonts, video and the usual
+# ad/analytics hosts. Stylesheets still load, since the visibility checks depend on layout.
+BLOCKED_URL_PATTERNS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf",
+    "*.mp4", "*.webm",
+    "*googletagmanager*", "*google-analytics*", "*doubleclick*", "*facebook.net*", "*hotjar*",
+]
+# Browsers that only hand back page source (web_scraper) never check visibility, so they
+# skip stylesheets as well
+SCRAPE_BLOCKED_URL_PATTERNS = BLOCKED_URL_PATTERNS + ["*.css"]
+
+# Opt-in Chrome profile kept between runs by the shared browser, so the HTTP cache, cookies
+# and service workers survive and repeat visits to a tariff site skip reloading its static
+# shell. Unset by default: each run then starts from a fresh, logged-out profile, and
+# concurrent runs don't contend for Chrome's profile lock.
+BROWSER_PROFILE_DIR = os.path.expanduser(os.getenv("CRAWLER_PROFILE_DIR", "")) or None
+BROWSER_DISK_CACHE_BYTES = 512 * 1024 * 1024
+
+# Fields of a CDP Network.Cookie that Network.setCookies accepts back
+COOKIE_PARAM_KEYS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
 class Browser:
-    def __init__(self):
+    def __init__(self, profile_dir: str = None, block_styles: bool = False):
         options = uc.ChromeOptions()
-        # options.add_argument("--headless")  # Uncomment if headless mode is desired
+        # Chrome locks a profile directory, so only one browser at a time may be given one;
+        # without it Chrome starts from a throwaway profile
+        if profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            options.add_argument(f"--user-data-dir={profile_dir}")
+            options.add_argument(f"--disk-cache-size={BROWSER_DISK_CACHE_BYTES}")
+        # Headless by default, since nothing needs the window; the "new" headless mode renders
+        # like regular Chrome. CRAWLER_HEADLESS=0 shows the window, e.g. to watch a run.
+        if os.getenv("CRAWLER_HEADLESS", "1").lower() not in ("0", "false", "no"):
+            options.add_argument("--headless=new")
         options.add_argument("--disable-gpu")
         options.add_argument("--no-sandbox")
         options.add_argument("--disable-dev-shm-usage")
+        # The crawler only reads the DOM, so skip downloading images and don't wait for
+        # subresources: driver.get() returns once the DOM is parsed
+        options.add_argument("--blink-settings=imagesEnabled=false")
+        options.page_load_strategy = "eager"
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+            "profile.default_content_setting_values.plugins": 2,
+        })
         
         # Set binary location to fix ChromeDriver issue
-        import shutil
-        import os
-
         # Check for available browsers
         browsers = ['chromium-browser', 'chromium', 'google-chrome', 'chrome', 'firefox', 'firefox-esr']
         print("Checking for browser paths:")
@@ -59,685 +178,2896 @@ class Browser:
                 options.binary_location = chrome_path
             
         self.driver = uc.Chrome(options=options)
+        # No implicit wait: the speculative lookups in the form and tariff flows expect "not
+        # found" to return immediately, and Selenium advises against mixing implicit and
+        # explicit waits. Anything that needs to wait uses wait_for() / WebDriverWait.
+        self.driver.implicitly_wait(0)
+        self.driver.execute_cdp_cmd("Network.enable", {})
+        self.set_blocked_urls(block_styles)
+
+        # Rebuild the command executor's pool with the same settings but room for concurrent commands
+        pool = self.driver.command_executor._conn
+        self.driver.command_executor._conn = urllib3.PoolManager(
+            **dict(pool.connection_pool_kw, maxsize=SELENIUM_POOL_MAXSIZE)
+        )
         self.wait_time = 10  # increased wait time for better page loading
 
+    def set_blocked_urls(self, block_styles: bool = False):
+        """
+        Blocks media and tracker requests, plus stylesheets when block_styles is set; only
+        for browsers whose pages are read as source, since visibility checks need the CSS.
+        """
+        patterns = SCRAPE_BLOCKED_URL_PATTERNS if block_styles else BLOCKED_URL_PATTERNS
+        self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+
+    def wait_until_ready(self) -> bool:
+        """Waits for the DOM to be parsed (see READY_STATES); returns False instead of raising on timeout."""
+        return wait_for(self.driver, document_is_ready, self.wait_time)
+
     def go_to_url(self, url: str):
         self.driver.get(url)
-        WebDriverWait(self.driver, self.wait_time).until(
-            lambda d: d.execute_script("return document.readyState") == "complete"
-        )
+        WebDriverWait(self.driver, self.wait_time, poll_frequency=WAIT_POLL_FREQUENCY).until(document_is_ready)
 
     def get_page_source(self) -> str:
-        time.sleep(1)
-        return self.driver.page_source
+        state = self.driver.execute_script(PAGE_STATE_JS)
+        if state["readyState"] not in READY_STATES:
+            self.wait_until_ready()
+            state = self.driver.execute_script(PAGE_STATE_JS)
+
+        return cached_page_source(self.driver, state)
+
+    def set_cookies(self, cookies: list):
+        """
+        Sets cookies read with all_cookies(driver) (any domain) before navigating, so the next
+        page load already carries another browser's session.
+        """
+        params = [
+            {key: cookie[key] for key in COOKIE_PARAM_KEYS if key in cookie}
+            for cookie in cookies
+        ]
+        for param, cookie in zip(params, cookies):
+            # Session cookies report expires -1, which CDP would read as already expired
+            if cookie.get("session"):
+                param.pop("expires", None)
+        if params:
+            self.driver.execute_cdp_cmd("Network.setCookies", {"cookies": params})
 
     def quit(self):
+        page_source_cache.pop(self.driver.session_id, None)
         self.driver.quit()
 
 
-browser = Browser()
-
-# --------------------------------------------------------------------------------
-# Tools
-# --------------------------------------------------------------------------------
-@tool
-def internet_searcher(query: str) -> str:
+def all_cookies(driver) -> list:
     """
-    Searches DuckDuckGo for the given query string, returning up to 10 results.
+    Every cookie the driver's browser holds, for all domains (CDP Network.getAllCookies),
+    unlike driver.get_cookies(), which only covers the current page's domain.
     """
-    try:
-        with DDGS() as ddgs:
-            results = list(ddgs.text(query, max_results=10))
-        if not results:
-            return "No results found."
-        response = f"Search results for '{query}':\n"
-        for i, result in enumerate(results, 1):
-            response += (
-                f"{i}. Title: {result['title']}\n"
-                f"   Summary: {result['body']}\n"
-                f"   Link: {result['href']}\n"
-            )
-        return response
-    except Exception as e:
-        return f"Error performing search: {str(e)}"
+    return driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
 
 
-@tool
-def web_scraper(url: str) -> str:
-    """
-    Navigates the Undetected ChromeDriver to the given URL and returns the page source.
-    """
-    try:
-        browser.go_to_url(url)
-        content = browser.get_page_source()
-        if content and len(content.strip()) > 0:
-            return content
-        else:
-            return "No content could be extracted from the page."
-    except Exception as uc_error:
-        return f"Error scraping with undetected-chromedriver: {str(uc_error)}"
+# Held while the shared browser or scraper pool is created or shut down
+browser_singletons_lock = threading.RLock()
 
 
-@tool
-def pdf_scraper(url: str) -> str:
+def locked_singleton(func):
     """
-    Downloads a PDF from the given URL and extracts its text contents.
+    Caches a no-argument factory like functools.lru_cache, but makes every call under
+    browser_singletons_lock. lru_cache alone lets concurrent first calls (tools run in
+    executor threads) each run the factory, starting a second Chrome that is never quit.
     """
-    try:
-        response = requests.get(url, timeout=15)
-        if response.status_code != 200:
-            return f"Failed to download PDF, status code: {response.status_code}"
-        pdf_text = ""
-        with pdfplumber.open(io.BytesIO(response.content)) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    pdf_text += page_text + "\n"
-        return pdf_text.strip() if pdf_text.strip() else "No text extracted from PDF."
-    except Exception as e:
-        return f"Error parsing PDF: {str(e)}"
+    cached = functools.lru_cache(maxsize=None)(func)
 
+    @functools.wraps(func)
+    def wrapper():
+        with browser_singletons_lock:
+            return cached()
+    wrapper.cache_info = cached.cache_info
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
 
-@tool
-def go_to_url_tool(url: str) -> str:
+
+@locked_singleton
+def get_browser() -> Browser:
     """
-    Directs the browser to navigate to the specified URL (no content extraction).
+    Starts the shared browser on first use, so tools that never touch a page don't launch
+    Chrome. It is the one browser that uses the persistent BROWSER_PROFILE_DIR, when set.
     """
-    browser.go_to_url(url)
-    return f"Navigated to {url}"
+    return Browser(profile_dir=BROWSER_PROFILE_DIR)
 
 
-@tool
-def get_page_source_tool(arg: str = "") -> str:
+def shared_session_cookies() -> list:
     """
-    Returns the current page source from the undetected ChromeDriver.
+    Every cookie in the shared browser, for all domains, or none if it hasn't been started,
+    so browsers working beside it see the pages behind the agent's login.
     """
-    return browser.get_page_source()
+    with browser_singletons_lock:
+        if not get_browser.cache_info().currsize:
+            return []
+        driver = get_browser().driver
+    return all_cookies(driver)
 
 
-@tool
-def shutdown_browser_tool(arg: str = "") -> str:
+def shutdown_browser():
     """
-    Shuts down the browser session (closes the undetected ChromeDriver).
+    Quits the shared browser and the scraper pool's browsers if they were started; the next
+    get_browser() or get_scraper_pool() call starts afresh.
     """
-    browser.quit()
-    return "Browser has been shut down."
+    with browser_singletons_lock:
+        if get_browser.cache_info().currsize:
+            get_browser().quit()
+            get_browser.cache_clear()
+        if get_scraper_pool.cache_info().currsize:
+            get_scraper_pool().close()
+            get_scraper_pool.cache_clear()
 
 
-@tool
-def fill_every_form_tool(arg: Dict[str, str] = None) -> str:
+class BrowserPool:
     """
-    Fills every form on the current page with data extracted by the LLM from user input,
-    or realistic random text if no data is provided, and dynamically identifies/submits.
-    Particularly effective for login forms if an email is provided.
-    Args:
-        arg (Dict[str, str], optional): Dictionary of field names and values extracted by the LLM.
-                                        For login forms, it's best to include "email" key.
-    Returns:
-        str: Detailed summary of actions taken.
+    A small pool of warm browsers, so parallel work reuses drivers instead of paying
+    chromedriver's startup cost for every task. Each Browser builds its own ChromeOptions,
+    since undetected_chromedriver cannot reuse an options object across instances.
+    Once closed, browsers still in use are quit when released rather than kept.
     """
-    driver = browser.driver
-    wait = WebDriverWait(driver, browser.wait_time)
+    def __init__(self, size: int = 2, **browser_options):
+        self.size = size
+        # Passed to every Browser the pool starts, e.g. block_styles=True
+        self.browser_options = browser_options
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
 
-    def guess_input_value(input_elem, custom_data=None):
-        """Generate input value using LLM-extracted data if provided, otherwise use realistic random data."""
-        input_type = (input_elem.get_attribute("type") or "").lower()
-        name_id_placeholder = (
-            (input_elem.get_attribute("name") or "").lower() +
-            (input_elem.get_attribute("id") or "").lower() +
-            (input_elem.get_attribute("placeholder") or "").lower()
-        ).strip()
-        pattern = input_elem.get_attribute("pattern")
+    def acquire(self) -> Browser:
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
 
-        if custom_data:
-            # Look for exact matches first, then partial matches
-            field_keys = [key.lower() for key in custom_data.keys()]
-            
-            # For email fields, prioritize email values regardless of field name
-            if "email" in name_id_placeholder or input_type == "email":
-                # Look for email value in custom_data
-                email_value = None
-                for key, value in custom_data.items():
-                    if isinstance(value, str) and "@" in value and "." in value:  # Basic email format check
-                        email_value = value
-                        break
-                
-                # If we found an email, return it
-                if email_value:
-                    return email_value
-            
-            # Dynamic form detection - identify login-like forms with minimal inputs
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        while not can_create:
+            # Wait for a browser to be released, giving up if the pool is closed meanwhile
             try:
-                driver = browser.driver
-                visible_inputs = [inp for inp in driver.find_elements(By.TAG_NAME, "input") 
-                                 if inp.is_displayed() and inp.get_attribute("type") not in ["hidden", "submit", "button"]]
-                
-                # Check for simple forms with few inputs - common for login forms
-                if len(visible_inputs) <= 3:  # If there are only a few input fields visible
-                    # First try to look for an email field in the form
-                    for key, value in custom_data.items():
-                        if isinstance(value, str) and "@" in value and "." in value:  # If we have an email in the data
-                            # Return email for likely email field
-                            return value
-                    
-                    # If no email in custom data, look at field attributes to determine likely type
-                    for input_elem in visible_inputs:
-                        name_attrs = (
-                            (input_elem.get_attribute("name") or "").lower() +
-                            (input_elem.get_attribute("id") or "").lower() +
-                            (input_elem.get_attribute("placeholder") or "").lower()
-                        )
-                        
-                        # For username/email field check
-                        if any(x in name_attrs for x in ["user", "email", "login", "account"]):
-                            for key, value in custom_data.items():
-                                if isinstance(value, str) and ("@" in value or "username" in key.lower() or "user" in key.lower()):
-                                    return value
-            except Exception as e:
-                pass
-            
-            # Check for exact match in field names
-            if any(key in name_id_placeholder for key in field_keys):
-                for key, value in custom_data.items():
-                    if key.lower() in name_id_placeholder:
-                        return value
-
-        if pattern:
-            if "10" in pattern:
-                return ''.join(random.choices(string.digits, k=10))
-            elif "[a-zA-Z]" in pattern:
-                return fake.word()
-        if "email" in name_id_placeholder:
-            return fake.email()
-        if "phone" in name_id_placeholder or "tel" in input_type:
-            return fake.phone_number()
-        if input_type == "password":
-            return fake.password(length=12)
-        if input_type == "date":
-            return fake.date()
-        if any(x in name_id_placeholder for x in ["name", "user"]):
-            return fake.name()
-        if any(x in name_id_placeholder for x in ["message", "comment", "description"]):
-            return fake.paragraph(nb_sentences=2)
-        if "address" in name_id_placeholder:
-            return fake.address()
-        return fake.text(max_nb_chars=20)
+                return self._idle.get(timeout=1)
+            except queue.Empty:
+                if self._closed:
+                    raise RuntimeError("Browser pool is closed")
 
-    def find_parent_clickable(element):
-        """Find the nearest clickable parent (e.g., button or div)."""
-        current = element
-        for _ in range(3):
-            try:
-                if current.is_displayed() and current.is_enabled() and current.tag_name in ["button", "div", "a", "span"]:
-                    return current
-                current = current.find_element(By.XPATH, "..")
-            except:
-                break
-        return element
-        
-    def find_and_click_image_buttons(driver, keywords=None, src_patterns=None, wait_time=3):
-        """
-        Find and click image buttons based on alt text keywords or src patterns.
-        
-        Args:
-            driver: The WebDriver instance
-            keywords: List of keywords to search for in alt text
-            src_patterns: List of patterns to search for in src attribute
-            wait_time: Time to wait after clicking
-            
-        Returns:
-            bool: True if an image button was found and clicked, False otherwise
-        """
-        if keywords is None:
-            keywords = ['submit', 'search', 'continue', 'next', 'go', 'login', 'sign', 'send', 'save', 'update', 'calc', 'apply']
-        
-        if src_patterns is None:
-            src_patterns = ['button', 'submit', 'search', 'arrow', 'next', 'login']
-        
-        # Build XPath for alt text keywords
-        alt_conditions = " or ".join([
-            f"contains(translate(@alt, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{kw.lower()}')" 
-            for kw in keywords
-        ])
-        
-        # Build XPath for src patterns
-        src_conditions = " or ".join([
-            f"contains(@src, '{pattern}')" 
-            for pattern in src_patterns
-        ])
-        
-        # Combine conditions
-        xpath = f"//img[{alt_conditions} or {src_conditions}]"
-        
         try:
-            images = driver.find_elements(By.XPATH, xpath)
-            
-            if images:
-                for img in images:
-                    if img.is_displayed():
-                        alt_text = img.get_attribute("alt") or ""
-                        src = img.get_attribute("src") or ""
-                        print(f"Found image button with alt text: '{alt_text}' and src: {src}")
-                        driver.execute_script("arguments[0].click();", img)
-                        time.sleep(wait_time)
-                        print(f"Clicked on image button: {alt_text or src}")
-                        return True
-        except Exception as e:
-            print(f"Error finding/clicking image buttons: {str(e)}")
-        
-        return False
+            return Browser(**self.browser_options)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
 
-    def is_submit_candidate(element, form):
-        """Dynamically determine if an element is a submit button based on context and behavior."""
-        elem_text = (element.text or "").lower()
-        tag = element.tag_name
-        if any(k in elem_text for k in ["submit", "send", "save", "confirm", "message"]) or tag in ["button", "input"]:
-            try:
-                parent_form = element.find_element(By.XPATH, "ancestor::form")
-                if parent_form == form:
-                    return True
-                if element in form.find_elements(By.XPATH, "following-sibling::*") or element in form.find_elements(By.XPATH, "preceding-sibling::*"):
-                    return True
-            except:
-                pass
-        return False
+    def release(self, browser: Browser):
+        # Checked and queued under the lock, so close() either drains this browser or we quit it
+        with self._lock:
+            closed = self._closed
+            if closed:
+                self._created -= 1
+            else:
+                self._idle.put(browser)
+        if closed:
+            browser.quit()
 
-    def detect_submission_change(driver):
-        """Check if a submission occurred by looking for URL changes, form count changes, or success messages."""
+    @contextlib.contextmanager
+    def browser(self):
+        browser = self.acquire()
         try:
-            initial_url = driver.current_url
-            initial_source = driver.page_source
-            initial_form_count = len(driver.find_elements(By.TAG_NAME, "form"))
-            
-            # For login detection, check if there are any visible email/username fields before
-            initial_login_fields = len(driver.find_elements(By.XPATH, 
-                "//input[contains(@type, 'email') or contains(@name, 'email') or contains(@id, 'email') or contains(@id, 'username') or contains(@name, 'username')]"))
-            
-            time.sleep(3)  # Increased wait time
-            
-            new_url = driver.current_url
-            new_source = driver.page_source
-            new_form_count = len(driver.find_elements(By.TAG_NAME, "form"))
-            
-            # For login detection, check if visible email/username fields disappeared
-            new_login_fields = len(driver.find_elements(By.XPATH, 
-                "//input[contains(@type, 'email') or contains(@name, 'email') or contains(@id, 'email') or contains(@id, 'username') or contains(@name, 'username')]"))
-            
-            success_indicators = ["thank you", "submitted", "success", "message sent", "your submission", "welcome", "dashboard", "account", "profile"]
-            source_changed = new_source != initial_source and any(indicator in new_source.lower() for indicator in success_indicators)
-            login_success = initial_login_fields > 0 and new_login_fields < initial_login_fields
-            
-            result = new_url != initial_url or new_form_count != initial_form_count or source_changed or login_success
-            
-            if result:
-                change_reasons = []
-                if new_url != initial_url:
-                    change_reasons.append(f"URL changed from {initial_url} to {new_url}")
-                if new_form_count != initial_form_count:
-                    change_reasons.append(f"Form count changed from {initial_form_count} to {new_form_count}")
-                if source_changed:
-                    change_reasons.append("Success indicator found in page source")
-                if login_success:
-                    change_reasons.append(f"Login fields reduced from {initial_login_fields} to {new_login_fields}")
-                
-                summary.append(f"Submission change detected: {', '.join(change_reasons)}")
-            
-            return result
-        except Exception as e:
-            summary.append(f"Error in detect_submission_change: {str(e)}")
-            return False
+            yield browser
+        finally:
+            self.release(browser)
 
-    summary = []
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                browser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            browser.quit()
+            with self._lock:
+                self._created -= 1
 
-    # Initial wait for page load
-    time.sleep(2)
 
-    # Navigate to contact/login form if requested
-    try:
-        # Look for login links or forms first
-        login_xpath = "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'login') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'sign in')]"
-        login_links = WebDriverWait(driver, 5).until(
-            EC.presence_of_all_elements_located((By.XPATH, login_xpath))
-        )
-        
-        if login_links:
-            for link in login_links:
-                if link.is_displayed() and link.is_enabled():
-                    driver.execute_script("arguments[0].scrollIntoView(true);", link)
-                    driver.execute_script("arguments[0].click();", link)
-                    summary.append("[main page] Clicked potential 'login/sign in' link to access form.")
-                    # Wait for form elements - look specifically for email or username inputs
-                    WebDriverWait(driver, browser.wait_time).until(
-                        EC.presence_of_element_located((By.XPATH, "//input[contains(@type, 'email') or contains(@name, 'email') or contains(@id, 'email') or contains(@id, 'username') or contains(@name, 'username')]"))
-                    )
-                    time.sleep(2)
-                    break
-        else:
-            # Fallback to looking for contact links
-            contact_links = WebDriverWait(driver, 5).until(
-                EC.presence_of_all_elements_located((By.XPATH, "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'contact')]"))
-            )
-            if contact_links:
-                for link in contact_links:
-                    if link.is_displayed() and link.is_enabled():
-                        driver.execute_script("arguments[0].scrollIntoView(true);", link)
-                        driver.execute_script("arguments[0].click();", link)
-                        summary.append("[main page] Clicked potential 'contact' link to access form.")
-                        WebDriverWait(driver, 5).until(
-                            EC.presence_of_element_located((By.TAG_NAME, "form"))
-                        )
-                        time.sleep(2)
-                        break
-    except Exception as e:
-        summary.append(f"[main page] Error navigating to form: {str(e)}")
+@locked_singleton
+def get_scraper_pool() -> BrowserPool:
+    """
+    The pool web_scraper reads pages with. Scraping a URL then leaves the shared browser,
+    and whatever page the form and navigation tools have open in it, untouched, and
+    concurrent scrapes don't take turns on one driver. Browsers start on first use and,
+    as nothing checks visibility on them, skip stylesheets too.
+    """
+    return BrowserPool(SCRAPER_POOL_SIZE, block_styles=True)
 
-    # Check main context and iframes
-    contexts = [(driver, "main page")]
-    iframes = driver.find_elements(By.TAG_NAME, "iframe")
-    for iframe in iframes:
-        try:
-            driver.switch_to.frame(iframe)
-            iframe_id = iframe.get_attribute("id") or "unnamed"
-            contexts.append((driver, f"iframe '{iframe_id}'"))
-            driver.switch_to.default_content()
-        except Exception as e:
-            summary.append(f"Error accessing iframe: {str(e)}")
+# --------------------------------------------------------------------------------
+# Selectors
+# --------------------------------------------------------------------------------
+# Lowercased alt attribute, for case-insensitive XPath contains() checks
+LOWER_ALT = "translate(@alt, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')"
 
-    form_count = 0
-    submitted_forms = 0
+# Lowercase keywords for CASE_TEXT_MATCH_JS and OWN_TEXT_MATCH_XPATH lookups
+LOGIN_LINK_KEYWORDS = ["login", "sign in"]
+CONTACT_LINK_KEYWORDS = ["contact"]
+DUTY_KEYWORDS = ["duty", "tax", "tariff"]
+DUTY_TEXT_KEYWORDS = ["duty", "tariff", "rate"]
+DUTY_RATE_KEYWORDS = ["duty", "rate", "tariff", "tax"]
+# Multi-keyword scans compiled into single case-insensitive alternations, so the page text
+# is scanned once rather than once per keyword. The patterns also run in the browser
+# through PAGE_TEXT_TEST_JS, so they must stay valid JavaScript regexes.
+SUCCESS_INDICATOR_RE = re.compile(
+    "|".join(map(re.escape, ["thank you", "submitted", "success", "message sent", "your submission", "welcome", "dashboard", "account", "profile"])),
+    re.IGNORECASE,
+)
+SUBMIT_TEXT_RE = re.compile("submit|send|save|confirm|message", re.IGNORECASE)
+THANK_YOU_RE = re.compile("thank you|your submission", re.IGNORECASE)
+# Text that shows a tariff search has returned results: a percentage or a rate label
+RESULT_MARKER_RE = re.compile(r"\d+(?:\.\d+)?\s*%|duty rate|tariff rate", re.IGNORECASE)
 
-    for context_driver, context_name in contexts:
-        if context_driver != driver:
-            try:
-                driver.switch_to.frame(context_driver)
-            except:
-                continue
+# document.readyState values at which a page counts as loaded. With the eager page load
+# strategy the DOM is usable at "interactive"; images and fonts are not waited for.
+READY_STATES = ("interactive", "complete")
 
-        # Check for success page immediately to avoid redundant processing
-        if "thank you" in driver.page_source.lower() or "your submission" in driver.page_source.lower():
-            summary.append(f"[{context_name}] Detected 'Thank you' page; submission already successful.")
-            submitted_forms += 1
-            break
+# Longest time to wait for a page to react to a submission attempt
+SUBMISSION_TIMEOUT = 5
 
-        forms = driver.find_elements(By.TAG_NAME, "form")
-        if not forms:
-            forms = [driver.find_element(By.TAG_NAME, "body")]
+# Seconds between WebDriverWait polls. Selenium's 0.5s default puts a half-second floor
+# under every lookup that is not satisfied on the first check.
+WAIT_POLL_FREQUENCY = 0.1
 
-        for form in forms:
-            form_count += 1
+# Most elements the last-resort scan clicks before giving up on a form
+LAST_RESORT_CLICK_LIMIT = 50
 
-            # Prioritize email fields first if we have an email in arg
-            email_value = None
-            if arg:
-                for key, value in arg.items():
-                    if "@" in value and "." in value:  # Basic email format check
-                        email_value = value
-                        break
-            
-            # First pass: identify all email fields using multiple strategies
-            email_fields = []
-            all_inputs = form.find_elements(By.XPATH, ".//input | .//textarea | .//select")
-            
-            # Try to find fields that are specifically for email
-            for inp in all_inputs:
-                try:
-                    itype = (inp.get_attribute("type") or "").lower()
-                    name = (inp.get_attribute("name") or "").lower()
-                    id_attr = (inp.get_attribute("id") or "").lower()
-                    
-                    # Check multiple attributes for "email" or related terms
-                    if (itype == "email" or 
-                        "email" in name or 
-                        "email" in id_attr or
-                        "user" in name or
-                        "user" in id_attr):
-                        email_fields.append(inp)
-                except:
-                    pass
+LOGIN_FIELD_CSS = "input[type*='email'], input[name*='email'], input[id*='email'], input[id*='username'], input[name*='username']"
+
+# Form and login field selectors counted by SUBMISSION_STATE_JS to tell whether a submission changed the page
+SUBMISSION_COUNT_SELECTORS = ["form", LOGIN_FIELD_CSS]
+
+# PROBE_JS queries for the login flow, one batch per page state
+LOGIN_LINK_PROBE = [
+    {"scope": "*", "css": "[href*='login'], [href*='signin'], [href*='account']", "text": ["login", "sign in", "log in"]},
+]
+LOGIN_FIELD_PROBES = [
+    {"css": "input[type*='email'], input[name*='email'], input[id*='email']"},
+    {"css": "input[id*='username'], input[name*='username'], input[placeholder*='username']"},
+    {"scope": "td, label, div", "text": ["email"], "next": True},
+    {"css": "input[type='text']"},
+]
+LOGIN_SUBMIT_PROBES = [
+    {"scope": "button", "text": ["sign in", "login", "submit"]},
+    {"scope": "input", "css": "input[type='submit']", "value": ["login", "sign in", "submit", "continue"]},
+    {"scope": "button", "text": ["login", "sign in", "submit", "continue"]},
+    {"scope": "*", "css": "[class*='login'], [id*='login']", "text": ["login", "sign in", "log in"]},
+]
+GLOBAL_TARIFFS_PROBE = [
+    {"scope": "*", "css": "[href*='GlobalTariffs']", "text": ["global tariffs"]},
+]
+# Inputs next to an email label, or labelled as email through aria-label/placeholder,
+# probed within a single form
+EMAIL_LABEL_PROBES = [
+    {"scope": "td, label", "text": ["email"], "next": True},
+    {"css": "input[aria-label*='email' i], input[placeholder*='email' i]"},
+]
+# Inputs right after an Email label, resolved by snapshot_inputs within a single form
+EMAIL_LABEL_INPUT_XPATH = ".//*[contains(text(), 'Email')]/following::input[position() < 3]"
+# Elements checked by SUBMIT_CANDIDATES_JS as possible submit buttons, within the form
+# first and then page-wide
+SUBMIT_CANDIDATE_CSS = "button, input, div, span, a"
+# Fields the Enter key fallback submits from
+TEXT_INPUT_CSS = "input[type='text'], input[type='email'], textarea"
+SEARCH_BUTTON_PROBE = [
+    {
+        "scope": "button, a, input",
+        "css": "input[type='submit'][value*='search' i], input[type='button'][value*='search' i], "
+               "button[id*='search'], button[class*='search'], input[id*='search'], input[class*='search']",
+        "text": ["search"],
+    },
+]
+
+# Default alt text keywords and src patterns identifying image buttons
+IMAGE_BUTTON_KEYWORDS = ('submit', 'search', 'continue', 'next', 'go', 'login', 'sign', 'send', 'save', 'update', 'calc', 'apply')
+IMAGE_BUTTON_SRC_PATTERNS = ('button', 'submit', 'search', 'arrow', 'next', 'login')
+
+# Image buttons that open details after a tariff search: after the main search, after the
+# Global Tariffs search, and when no Calculate button was found on the duty page
+ACTION_KEYWORDS = ('view', 'details', 'calc', 'show', 'open', 'more', 'info', 'select', 'next')
+ACTION_SRC_PATTERNS = ('button', 'arrow', 'view', 'details', 'next')
+RESULT_ACTION_KEYWORDS = ACTION_KEYWORDS + ('continue',)
+RESULT_ACTION_SRC_PATTERNS = ACTION_SRC_PATTERNS + ('continue',)
+DUTY_ACTION_KEYWORDS = RESULT_ACTION_KEYWORDS + ('proceed',)
+
+# Ranked lookups for the HS code input, evaluated by SCAN_PAGE_JS. Inputs next to
+# an HS Code label only count when visible; common search fields cover the usual ids and
+# names across trade/tariff sites; the last tier is any text input not for login or search.
+HS_CODE_FIELD_TIERS = [
+    {
+        "label": "HS Code attributes",
+        "xpath": "//input[contains(@id, 'HSCode') or contains(@name, 'HSCode') or "
+                 "contains(@placeholder, 'HS Code') or contains(@placeholder, 'Enter HS Code')]",
+    },
+    {
+        "label": "HS Code label",
+        "xpath": "//td[contains(text(), 'HS Code')]/following-sibling::td//input | "
+                 "//input[preceding-sibling::*[contains(text(), 'HS Code')]]",
+        "visible": True,
+    },
+    {
+        "label": "common product code search field",
+        "xpath": "//input["
+                 "contains(@id, 'search') or contains(@name, 'search') or "
+                 "contains(@id, 'code') or contains(@name, 'code') or "
+                 "contains(@id, 'tariff') or contains(@name, 'tariff') or "
+                 "contains(@id, 'hs') or contains(@name, 'hs') or "
+                 "contains(@id, 'hts') or contains(@name, 'hts') or "
+                 "contains(@placeholder, 'Search') or contains(@placeholder, 'Enter code') or "
+                 "@id='tb_HSCodeNumber' or @name='tb_HSCodeNumber' or "
+                 "@id='txtHSCode' or @name='txtHSCode' or "
+                 "@id='txtSearchCode' or @name='txtSearchCode']",
+    },
+    {
+        "label": "generic text field",
+        "xpath": "//input[@type='text' and not("
+                 "contains(@id, 'email') or contains(@name, 'email') or "
+                 "contains(@id, 'user') or contains(@name, 'user') or "
+                 "contains(@id, 'password') or contains(@name, 'password') or "
+                 "contains(@id, 'search') or contains(@name, 'search'))]",
+    },
+]
+
+# Tariff lookup selectors used by the HS code / country flow in __main__
+COUNTRY_SELECT_CSS = "select[id*='Country'], select[name*='Country']"
+COUNTRY_INPUT_CSS = "input[id*='Country'], input[name*='Country']"
+COUNTRY_FIELD_FALLBACK_XPATH = (
+    "//input[contains(@placeholder, 'country') or contains(@placeholder, 'dest')] | "
+    "//span[contains(text(), 'Country') or contains(text(), 'Destination')]/following-sibling::*[1]"
+)
+COUNTRY_DROPDOWN_CSS = "select[id*='Country']"
+COUNTRY_DROPDOWN_LABEL_XPATH = "//select[following-sibling::text()[contains(., 'Country')]]"
+PRODUCT_CODE_FIELD_XPATH = (
+    "//input[contains(@id, 'code') or contains(@name, 'code') or "
+    "contains(@id, 'product') or contains(@name, 'product') or "
+    "contains(@id, 'hs') or contains(@name, 'hs') or "
+    "contains(@placeholder, 'code') or contains(@placeholder, 'product') or "
+    "contains(@placeholder, 'search')]"
+)
+SEARCH_CONTROL_XPATH = (
+    "//input[@type='submit' or @value='Search' or contains(@onclick, 'search')] | "
+    "//button[contains(text(), 'Search') or contains(@onclick, 'search')] | "
+    "//a[contains(text(), 'Search') or contains(@onclick, 'search')]"
+)
+SEARCH_BUTTON_XPATH = (
+    "//button[contains(text(), 'Search') or contains(@value, 'Search')] | "
+    "//input[@type='submit' or @type='button'][contains(@value, 'Search')]"
+)
+ANY_BUTTON_CSS = "button, input[type='submit'], input[type='button']"
+CALCULATE_BUTTON_CSS = "input[value='Calculate'][id*='Calculate'], input[type='button'][id*='Calculate']"
+SUGGESTION_ITEM_XPATH = (
+    "//div[contains(@class, 'autocomplete') or contains(@class, 'suggestion')]//li | "
+    "//ul[contains(@class, 'autocomplete') or contains(@class, 'suggestion')]//li"
+)
+AUTOCOMPLETE_ITEM_XPATH = (
+    "//div[contains(@class, 'autocomplete') or contains(@class, 'dropdown') or contains(@class, 'suggestion')]//li | "
+    "//ul[contains(@class, 'autocomplete') or contains(@class, 'dropdown') or contains(@class, 'suggestion')]//li"
+)
+TOGGLE_CSS = (
+    "[id*='toggle'], [class*='toggle'], [class*='expand'], [class*='collapse'], "
+    "[title*='expand'], [title*='show more']"
+)
+GLOBAL_TARIFF_LINK_XPATH = "//a[contains(@href, 'GlobalTariffs') or contains(text(), 'Global Tariff') or contains(text(), 'Tariff')]"
+HS_CODE_HEADER_XPATH = "//div[contains(text(), 'HS Code:') or contains(text(), 'Full HS Code')]"
+DUTIES_TAB_XPATH = "//*[contains(text(), 'Duties and Taxes') or contains(text(), 'Duty') or contains(text(), 'Tariff')]"
+PERCENT_TEXT_XPATH = "//*[contains(text(), '%')]"
+# The closest of an element's five nearest ancestors whose text holds a percentage
+PERCENT_ANCESTOR_XPATH = "ancestor::*[position() <= 5][contains(., '%')][1]"
+ENCLOSING_ROW_XPATH = "ancestor::tr[1] | ancestor::div[contains(@class, 'row')][1]"
+LOCAL_PERCENT_TEXT_XPATH = ".//*[contains(text(), '%')]"
+BRAZIL_TEXT_XPATH = "//*[contains(text(), 'Brazil') or text()='BR']"
+DESCRIPTION_TEXT_XPATH = "//*[contains(text(), 'Endoscopy') or contains(text(), 'endoscopy')]"
+
+# Read-only lookups evaluated against an lxml snapshot of the page (see page_tree) rather
+# than through the driver; $code is bound per call
+RESULT_TABLE_XPATH = etree.XPath("//table[.//td[contains(text(), $code)]]")
+PAGE_TEXT_XPATH = etree.XPath("//body//text()[not(ancestor::script or ancestor::style)]")
+TABLES_XPATH = etree.XPath("//table")
+TABLE_ROWS_XPATH = etree.XPath(".//tr")
+ROW_CELLS_XPATH = etree.XPath(".//td")
+TABLE_HEADERS_XPATH = etree.XPath(".//th")
+# Elements in the body with an own text node matching the regex $pattern case-insensitively
+# (EXSLT re:test, so every keyword is checked in one pass), skipping script and style
+# contents and anything hidden by the hidden attribute or an inline display:none
+OWN_TEXT_MATCH_XPATH = etree.XPath(
+    "//body//*[not(self::script or self::style)][text()[re:test(., $pattern, 'i')]]"
+    "[not(ancestor-or-self::*[@hidden or contains(translate(@style, ' ', ''), 'display:none')])]",
+    namespaces={"re": "http://exslt.org/regular-expressions"},
+)
+# Rows of a table listing $code that have a cell matching the regex $country and show a
+# percentage: the usual shape of a successful lookup
+COUNTRY_RATE_ROWS_XPATH = etree.XPath(
+    "//table[.//td[contains(text(), $code)]]//tr[td[re:test(normalize-space(.), $country, 'i')]][contains(., '%')]",
+    namespaces={"re": "http://exslt.org/regular-expressions"},
+)
+
+# Lookups batched into one SCAN_PAGE_JS call each: the tariff form fields on page load, and
+# the search buttons once the fields are filled (the specific XPath first, any button second)
+TARIFF_FORM_SCAN = {
+    "hs_code": HS_CODE_FIELD_TIERS,
+    "country_select": [{"css": COUNTRY_SELECT_CSS}],
+    "country_text": [{"css": COUNTRY_INPUT_CSS}],
+}
+SEARCH_BUTTON_SCAN = {
+    "search": [{"xpath": SEARCH_BUTTON_XPATH}, {"css": ANY_BUTTON_CSS}],
+}
+# The result detail view's controls, probed together before any of them is clicked. Attribute
+# matches use CSS; the dropdown falls back to XPath for the text-labelled case CSS cannot express.
+DETAIL_VIEW_SCAN = {
+    "duties_tab": [{"xpath": DUTIES_TAB_XPATH}],
+    "country_dropdowns": [{"css": COUNTRY_DROPDOWN_CSS}, {"xpath": COUNTRY_DROPDOWN_LABEL_XPATH}],
+    "calc_buttons": [{"css": CALCULATE_BUTTON_CSS}],
+}
+
+# --------------------------------------------------------------------------------
+# Input Patterns
+# --------------------------------------------------------------------------------
+EMAIL_RE = re.compile(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+')
+URL_RE = re.compile(r'https?://[^\s]+')
+PERCENT_RE = re.compile(r'\d+(?:\.\d+)?\s*%')
+# Whole words only (plurals allowed), so "feedback" or "taxonomy" don't count as duty terms
+DUTY_TERMS_RE = re.compile(
+    r'\b(dut(?:y|ies)|tax(?:es)?|tariffs?|vat|customs|lev(?:y|ies)|charges?|fees?)\b', re.IGNORECASE
+)
+
+# Product code types and their patterns, in the order they are reported
+CODE_PATTERNS = {
+    "HS Code (10-digit)": re.compile(r'\b\d{4}\.\d{2}\.\d{2}\b'),
+    "HS Code (6-digit)": re.compile(r'\b\d{4}\.\d{2}\b'),
+    "HS Code (4-digit)": re.compile(r'\b\d{4}\b'),
+    "HTS Code": re.compile(r'\b\d{4}\.\d{2}\.\d{4}\b'),
+    "Schedule B": re.compile(r'\b\d{10}\b'),
+    "ECCN Code": re.compile(r'\b\d[A-Z]\d{3}[A-Z]\b'),
+}
+
+# Country name, ISO-3 and ISO-2 aliases, each compiled into one case-insensitive alternation
+COUNTRY_PATTERNS = {
+    country: re.compile("|".join(aliases), re.IGNORECASE)
+    for country, aliases in {
+        "Brazil": [r'\bbrazil\b', r'\bbra\b', r'\bbr\b'],
+        "China": [r'\bchina\b', r'\bchn\b', r'\bcn\b'],
+        "United States": [r'\bunited states\b', r'\busa\b', r'\bus\b', r'\bu\.s\.a?\b'],
+        "India": [r'\bindia\b', r'\bind\b', r'\bin\b'],
+        "Japan": [r'\bjapan\b', r'\bjpn\b', r'\bjp\b'],
+        "Mexico": [r'\bmexico\b', r'\bmex\b', r'\bmx\b'],
+    }.items()
+}
+
+# ISO-2/ISO-3 (and common) codes per lowercased country name, used to find country options
+# on sites that list codes instead of names
+COUNTRY_CODES = {
+    "united states": ["US", "USA"],
+    "brazil": ["BR", "BRA"],
+    "china": ["CN", "CHN"],
+    "india": ["IN", "IND"],
+    "japan": ["JP", "JPN"],
+    "germany": ["DE", "DEU"],
+    "united kingdom": ["GB", "GBR", "UK"],
+    "france": ["FR", "FRA"],
+    "italy": ["IT", "ITA"],
+    "canada": ["CA", "CAN"],
+    "australia": ["AU", "AUS"],
+    "spain": ["ES", "ESP"],
+    "mexico": ["MX", "MEX"],
+    "south korea": ["KR", "KOR"],
+    "russia": ["RU", "RUS"],
+}
+
+# One prebuilt XPath per country code, in COUNTRY_CODES order
+COUNTRY_CODE_XPATHS = {
+    country: [f"//*[text()='{code}' or @value='{code}']" for code in codes]
+    for country, codes in COUNTRY_CODES.items()
+}
+
+# --------------------------------------------------------------------------------
+# Page Scripts
+# --------------------------------------------------------------------------------
+# Cheap fingerprint of the current document, used to tell whether a cached page source is
+# stale. The 32-bit rolling hash of the markup catches same-length updates on the same URL,
+# such as one rate replacing another after an AJAX lookup.
+PAGE_STATE_JS = """
+var html = document.documentElement ? document.documentElement.innerHTML : '';
+var hash = 0;
+for (var i = 0; i < html.length; i++) {
+    hash = (hash * 31 + html.charCodeAt(i)) | 0;
+}
+return {
+    url: location.href,
+    readyState: document.readyState,
+    elementCount: document.getElementsByTagName('*').length,
+    htmlLength: html.length,
+    htmlHash: hash
+};
+"""
+
+# PAGE_STATE_JS's fingerprint plus, as results, whether the page's text matches the
+# case-insensitive pattern arguments[0] or any node matches the XPath arguments[1]
+SEARCH_STATE_JS = """
+var body = document.body;
+var text = body ? body.innerText : '';
+var html = document.documentElement ? document.documentElement.innerHTML : '';
+var hash = 0;
+for (var i = 0; i < html.length; i++) {
+    hash = (hash * 31 + html.charCodeAt(i)) | 0;
+}
+return {
+    url: location.href,
+    readyState: document.readyState,
+    elementCount: document.getElementsByTagName('*').length,
+    htmlLength: html.length,
+    htmlHash: hash,
+    results: new RegExp(arguments[0], 'i').test(text) ||
+        document.evaluate(arguments[1], document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue !== null
+};
+"""
+
+# The document's readyState and how many resource requests (scripts, XHR, fetch) it has
+# completed, for telling when the network has gone quiet. Counted by a PerformanceObserver
+# (seeded with the buffered entries) rather than from the resource timing buffer, which
+# stops growing at 250 entries by default on heavy pages.
+NETWORK_STATE_JS = """
+if (window.__crawlerResourceCount === undefined) {
+    window.__crawlerResourceCount = 0;
+    new PerformanceObserver(function (list) {
+        window.__crawlerResourceCount += list.getEntries().length;
+    }).observe({type: 'resource', buffered: true});
+}
+return [document.readyState, window.__crawlerResourceCount];
+"""
+
+# Collects every form field under arguments[0] (or the whole document) with the attributes
+# fill_every_form_tool needs, so the form is inspected in a single WebDriver round-trip.
+# When arguments[1] is given, the root is also tagged with it as data-crawler-form.
+FORM_FIELDS_JS = """
+var root = arguments[0] || document;
+if (arguments[1] && root.setAttribute) {
+    root.setAttribute('data-crawler-form', arguments[1]);
+}
+return Array.from(root.querySelectorAll('input, textarea, select')).map(function (e) {
+    return {
+        element: e,
+        tag: e.tagName.toLowerCase(),
+        type: (e.type || '').toLowerCase(),
+        name: e.name || '',
+        id: e.id || '',
+        placeholder: e.placeholder || '',
+        pattern: e.pattern || '',
+        visible: !!(e.offsetWidth || e.offsetHeight || e.getClientRects().length),
+        enabled: !e.disabled,
+        checked: !!e.checked
+    };
+});
+"""
+
+# Submits the form tagged with data-crawler-form=arguments[0], falling back to
+# document.forms[arguments[1]]; requestSubmit() runs validation and fires the submit event
+SUBMIT_FORM_JS = """
+var form = document.querySelector('form[data-crawler-form="' + arguments[0] + '"]') || document.forms[arguments[1]];
+if (!form) {
+    return false;
+}
+if (typeof form.requestSubmit === 'function') {
+    form.requestSubmit();
+} else {
+    form.submit();
+}
+return true;
+"""
+
+# Lowercased text of an element's own text nodes, the JS counterpart of XPath's text().
+# Matching on textContent instead would also match every ancestor up to <body>.
+OWN_TEXT_JS = """
+function ownText(e) {
+    var text = '';
+    for (var n = e.firstChild; n; n = n.nextSibling) {
+        if (n.nodeType === 3) {
+            text += n.nodeValue;
+        }
+    }
+    return text.toLowerCase();
+}
+"""
+
+# Element summary returned by the probe scripts; visible mirrors WebElement.is_displayed()
+# closely enough for candidate filtering without a round-trip per element
+DESCRIBE_JS = """
+function describe(e) {
+    return {
+        element: e,
+        tag: e.tagName.toLowerCase(),
+        text: (e.innerText || '').trim().slice(0, 80),
+        name: e.name || '',
+        id: e.id || '',
+        value: typeof e.value === 'string' ? e.value : '',
+        visible: !!(e.offsetWidth || e.offsetHeight || e.getClientRects().length) && getComputedStyle(e).visibility !== 'hidden',
+        enabled: !e.disabled
+    };
+}
+"""
+
+# Describes every element in arguments[0], replacing per-element is_displayed()/is_enabled()/.text calls
+ELEMENT_STATE_JS = DESCRIBE_JS + """
+return arguments[0].map(describe);
+"""
+
+# The elements of arguments[0] that are visible and, when arguments[1] is set, enabled,
+# in their original order; visible is the same check as describe()'s
+VISIBLE_FILTER_JS = """
+var enabled = arguments[1];
+return arguments[0].filter(function (e) {
+    var visible = !!(e.offsetWidth || e.offsetHeight || e.getClientRects().length) && getComputedStyle(e).visibility !== 'hidden';
+    return visible && (!enabled || !e.disabled);
+});
+"""
+
+# Elements matching the CSS selector arguments[0] under arguments[2] (or the document)
+# whose own text contains one of the lowercase keywords in arguments[1]. Replaces
+# translate()-based XPath contains() checks with a native toLowerCase().
+CASE_TEXT_MATCH_JS = OWN_TEXT_JS + """
+var keywords = arguments[1];
+return Array.from((arguments[2] || document).querySelectorAll(arguments[0])).filter(function (e) {
+    var text = ownText(e);
+    return keywords.some(function (k) { return text.indexOf(k) !== -1; });
+});
+"""
+
+# Runs a set of named lookups in one pass. arguments[0] maps each name to a ranked list of
+# queries ({css} or {xpath}, optionally visible); each name gets the matches of its first
+# query that has any as {tier, elements}. Queries with visible set ignore hidden matches.
+SCAN_PAGE_JS = """
+var scan = arguments[0], found = {};
+for (var name in scan) {
+    found[name] = {tier: -1, elements: []};
+    for (var i = 0; i < scan[name].length; i++) {
+        var query = scan[name][i], elements = [];
+        if (query.css) {
+            elements = Array.from(document.querySelectorAll(query.css));
+        } else {
+            var result = document.evaluate(query.xpath, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+            for (var j = 0; j < result.snapshotLength; j++) {
+                elements.push(result.snapshotItem(j));
+            }
+        }
+        if (query.visible) {
+            elements = elements.filter(function (e) {
+                return e.offsetWidth || e.offsetHeight || e.getClientRects().length;
+            });
+        }
+        if (elements.length) {
+            found[name] = {tier: i, elements: elements};
+            break;
+        }
+    }
+}
+return found;
+"""
+
+# The first arguments[0] visible, enabled elements that look clickable. Selected by CSS and
+# bounded in the browser, so plain layout divs and spans are never sent over the wire.
+CLICKABLE_CANDIDATES_JS = DESCRIBE_JS + """
+var found = [];
+var elements = document.querySelectorAll("button, input, a, [role='button'], [onclick]");
+for (var i = 0; i < elements.length && found.length < arguments[0]; i++) {
+    var state = describe(elements[i]);
+    if (state.visible && state.enabled) {
+        found.push(state);
+    }
+}
+return found;
+"""
+
+# Everything detect_submission_change compares, in one round-trip: the URL, how many forms
+# and login fields (arguments[0] and arguments[1] are their selectors) the page holds, a
+# 32-bit rolling hash of the visible text, and whether that text matches the
+# case-insensitive success pattern arguments[2]
+SUBMISSION_STATE_JS = """
+var text = document.body ? document.body.innerText.toLowerCase() : '';
+var hash = 0;
+for (var i = 0; i < text.length; i++) {
+    hash = (hash * 31 + text.charCodeAt(i)) | 0;
+}
+return {
+    url: location.href,
+    formCount: document.querySelectorAll(arguments[0]).length,
+    loginFieldCount: document.querySelectorAll(arguments[1]).length,
+    bodyHash: hash,
+    hasSuccess: new RegExp(arguments[2], 'i').test(text)
+};
+"""
+
+# Scrolls arguments[0] into view and clicks it in one round-trip, returning its tag name
+SCROLL_CLICK_JS = """
+arguments[0].scrollIntoView({block: 'center'});
+arguments[0].click();
+return arguments[0].tagName.toLowerCase();
+"""
+
+# Clicks the first element of arguments[0] that is visible (and, when arguments[1] is set,
+# enabled) and returns its text or value, or null if none is; the same visibility check
+# as VISIBLE_FILTER_JS
+CLICK_FIRST_VISIBLE_JS = """
+var enabled = arguments[1];
+for (var i = 0; i < arguments[0].length; i++) {
+    var e = arguments[0][i];
+    var visible = !!(e.offsetWidth || e.offsetHeight || e.getClientRects().length) && getComputedStyle(e).visibility !== 'hidden';
+    if (visible && (!enabled || !e.disabled)) {
+        e.click();
+        return (e.innerText || e.value || '').trim();
+    }
+}
+return null;
+"""
+
+# Every option of the <select> arguments[0] as [index, text, value], read in one round-trip
+SELECT_OPTIONS_JS = """
+return Array.from(arguments[0].options).map(function (o, i) { return [i, o.text, o.value]; });
+"""
+
+# Clicks the first visible item matched by the XPath arguments[0] whose text contains
+# arguments[1] (case-insensitively) and returns its text, or null if no item matches yet
+CLICK_SUGGESTION_JS = """
+var needle = arguments[1].toLowerCase();
+var result = document.evaluate(arguments[0], document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+for (var i = 0; i < result.snapshotLength; i++) {
+    var e = result.snapshotItem(i);
+    var text = (e.innerText || '').trim();
+    if ((e.offsetWidth || e.offsetHeight || e.getClientRects().length) && text.toLowerCase().indexOf(needle) !== -1) {
+        e.click();
+        return text;
+    }
+}
+return null;
+"""
+
+# Selects the option of the <select> arguments[0] whose value is arguments[1] and fires a
+# bubbling change event. Returns false, leaving the selection as it was, if no option has it.
+SET_SELECT_JS = """
+var s = arguments[0], previous = s.selectedIndex;
+s.value = arguments[1];
+if (s.value !== arguments[1]) {
+    s.selectedIndex = previous;
+    return false;
+}
+s.dispatchEvent(new Event('change', {bubbles: true}));
+return true;
+"""
+
+# Records every XHR and fetch request the page makes as {method, url, headers, body} in
+# window.__crawlerRequests, so a tariff site's lookup endpoint can be replayed over plain
+# HTTP. Bodies are kept only when they are strings. Installing it twice is a no-op.
+REQUEST_CAPTURE_JS = """
+if (!window.__crawlerRequests) {
+    window.__crawlerRequests = [];
+    var xhrOpen = XMLHttpRequest.prototype.open;
+    var xhrSetHeader = XMLHttpRequest.prototype.setRequestHeader;
+    var xhrSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.open = function (method, url) {
+        this.__crawlerRequest = {method: method, url: new URL(url, location.href).href, headers: {}, body: null};
+        return xhrOpen.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.setRequestHeader = function (name, value) {
+        if (this.__crawlerRequest) {
+            this.__crawlerRequest.headers[name] = value;
+        }
+        return xhrSetHeader.apply(this, arguments);
+    };
+    XMLHttpRequest.prototype.send = function (body) {
+        if (this.__crawlerRequest) {
+            this.__crawlerRequest.body = typeof body === 'string' ? body : null;
+            window.__crawlerRequests.push(this.__crawlerRequest);
+        }
+        return xhrSend.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var pageFetch = window.fetch;
+        window.fetch = function (input, init) {
+            init = init || {};
+            window.__crawlerRequests.push({
+                method: init.method || input.method || 'GET',
+                url: new URL(typeof input === 'string' ? input : (input.url || String(input)), location.href).href,
+                headers: init.headers && !(init.headers instanceof Headers) ? init.headers : {},
+                body: typeof init.body === 'string' ? init.body : null
+            });
+            return pageFetch.apply(this, arguments);
+        };
+    }
+}
+"""
+
+# Requests recorded by REQUEST_CAPTURE_JS in the current document
+CAPTURED_REQUESTS_JS = "return window.__crawlerRequests || [];"
+
+# Sets arguments[0]'s value to arguments[1] and fires input/change events, returning the
+# resulting value. The prototype's value setter is used so that frameworks which track the
+# value themselves (React) see the change.
+SET_VALUE_JS = """
+var e = arguments[0];
+var descriptor = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(e), 'value');
+e.focus();
+if (descriptor && descriptor.set) {
+    descriptor.set.call(e, arguments[1]);
+} else {
+    e.value = arguments[1];
+}
+e.dispatchEvent(new Event('input', {bubbles: true}));
+e.dispatchEvent(new Event('change', {bubbles: true}));
+return e.value;
+"""
+
+# Tests the page's visible text against the case-insensitive pattern in arguments[0], so
+# keyword checks run in the browser instead of transferring the full page source
+PAGE_TEXT_TEST_JS = """
+return new RegExp(arguments[0], 'i').test(document.body ? document.body.innerText : '');
+"""
+
+# Summarises every iframe on the page: its id and, for same-origin frames, how many form
+# fields it holds. Cross-origin frames report -1, since they can only be inspected by
+# switching into them.
+FRAME_SUMMARY_JS = """
+return Array.from(document.getElementsByTagName('iframe')).map(function (f) {
+    var doc = null;
+    try {
+        doc = f.contentDocument;
+    } catch (e) {}
+    return {
+        element: f,
+        id: f.id || '',
+        fields: doc ? doc.querySelectorAll('input, textarea, select').length : -1
+    };
+});
+"""
+
+# Submits the form containing arguments[0], returning "submitted", or "no-form" when the
+# element is not inside one
+SUBMIT_CLOSEST_FORM_JS = """
+var form = arguments[0].closest('form');
+if (!form) {
+    return 'no-form';
+}
+if (typeof form.requestSubmit === 'function') {
+    form.requestSubmit();
+} else {
+    form.submit();
+}
+return 'submitted';
+"""
+
+# Possible submit buttons for the form arguments[1]: the elements matching the CSS selector
+# arguments[3] under arguments[0] (or the document) whose nearest enclosing form is that
+# form, and which are visible, enabled, and either a button/input or labelled with text
+# matching the case-insensitive pattern arguments[2]. Described like ELEMENT_STATE_JS;
+# the form check runs first so text is only read for elements inside the form.
+SUBMIT_CANDIDATES_JS = DESCRIBE_JS + """
+var form = arguments[1], label = new RegExp(arguments[2], 'i');
+return Array.from((arguments[0] || document).querySelectorAll(arguments[3])).filter(function (e) {
+    return e.closest('form') === form;
+}).map(describe).filter(function (d) {
+    return d.visible && d.enabled && (d.tag === 'button' || d.tag === 'input' || label.test(d.text));
+});
+"""
+
+# The first of arguments[0], its parent and its grandparent that is a visible, enabled
+# button, div, a or span; arguments[0] itself if none is
+CLICKABLE_PARENT_JS = """
+var e = arguments[0];
+for (var i = 0; i < 3 && e; i++) {
+    var visible = !!(e.offsetWidth || e.offsetHeight || e.getClientRects().length);
+    if (visible && !e.disabled && ['button', 'div', 'a', 'span'].indexOf(e.tagName.toLowerCase()) !== -1) {
+        return e;
+    }
+    e = e.parentElement;
+}
+return arguments[0];
+"""
+
+# Runs a batch of element probes in one round-trip. arguments[0] is a list of queries
+# {scope, css, text, value, next}: candidates are scope (or css) matches under arguments[1]
+# (or the document), kept when they match css, when their own text or value contains one
+# of the lowercase keywords, or unconditionally when only css is given. With next set, the
+# inputs following each match (directly, inside a following cell, or inside a label) are
+# returned instead. Returns one list per query.
+PROBE_JS = OWN_TEXT_JS + DESCRIBE_JS + """
+var root = arguments[1] || document;
+function hasKeyword(text, keywords) {
+    return !!keywords && keywords.some(function (k) { return text.indexOf(k) !== -1; });
+}
+function following(e) {
+    var inputs = e.tagName === 'LABEL' ? Array.from(e.children).filter(function (c) { return c.tagName === 'INPUT'; }) : [];
+    for (var s = e.nextElementSibling; s; s = s.nextElementSibling) {
+        if (s.tagName === 'INPUT') {
+            inputs.push(s);
+        } else if (s.tagName === 'TD') {
+            inputs.push.apply(inputs, Array.from(s.children).filter(function (c) { return c.tagName === 'INPUT'; }));
+        }
+    }
+    return inputs;
+}
+return arguments[0].map(function (q) {
+    var found = Array.from(root.querySelectorAll(q.scope || q.css)).filter(function (e) {
+        if (!q.scope && !q.text && !q.value) {
+            return true;
+        }
+        return (q.css && e.matches(q.css)) ||
+            hasKeyword(ownText(e), q.text) ||
+            hasKeyword(typeof e.value === 'string' ? e.value.toLowerCase() : '', q.value);
+    });
+    if (q.next) {
+        found = [].concat.apply([], found.map(following)).filter(function (e, i, all) { return all.indexOf(e) === i; });
+    }
+    return found.map(describe);
+});
+"""
+
+# --------------------------------------------------------------------------------
+# Page Helpers
+# --------------------------------------------------------------------------------
+# Last page source fetched by each driver session, with the page state it was fetched in
+page_source_cache: Dict[str, tuple] = {}
+
+
+def document_is_ready(driver) -> bool:
+    return driver.execute_script("return document.readyState") in READY_STATES
+
+
+def element_states(driver, elements) -> list:
+    """Returns an ELEMENT_STATE_JS summary for each element, fetched in a single round-trip."""
+    if not elements:
+        return []
+    return driver.execute_script(ELEMENT_STATE_JS, elements)
+
+
+def visible_elements(driver, elements, enabled=False) -> list:
+    """
+    Returns the elements that are displayed (and, with enabled, not disabled), filtered in
+    one script call instead of an is_displayed()/is_enabled() round-trip per element.
+    """
+    if not elements:
+        return []
+    return driver.execute_script(VISIBLE_FILTER_JS, elements, enabled)
+
+
+def scroll_click(driver, element) -> str:
+    """Scrolls the element into view and clicks it with a single script call; returns its tag name."""
+    return driver.execute_script(SCROLL_CLICK_JS, element)
+
+
+def fill_field(driver, element, value: str) -> None:
+    """
+    Fills a field with one script call instead of a keystroke round-trip per character,
+    typing the value only when the page rejected the scripted one.
+    """
+    if not driver.execute_script(SET_VALUE_JS, element, value):
+        element.clear()
+        element.send_keys(value)
+
+
+def cdp_eval(driver, script: str, *args):
+    """
+    Runs a script body through CDP Runtime.evaluate, skipping WebDriver's argument and
+    element marshalling; the body reads args as arguments[i], as with execute_script.
+    CDP evaluates in the top-level document, so this must not be used inside a frame.
+    """
+    response = driver.execute_cdp_cmd("Runtime.evaluate", {
+        "expression": f"(function () {{{script}}}).apply(null, {json.dumps(args)})",
+        "returnByValue": True,
+        "awaitPromise": True,
+    })
+    if "exceptionDetails" in response:
+        raise JavascriptException(response["exceptionDetails"].get("text", "Script failed"))
+    return response["result"].get("value")
+
+
+def click_suggestion(driver, xpath: str, needle: str, timeout=3):
+    """
+    Waits for an autocomplete item (matched by xpath) containing needle and clicks it, the
+    lookup and click being one script call per poll. Returns the clicked item's text, or
+    None if no matching item appeared within timeout.
+    """
+    return wait_for(driver, lambda d: d.execute_script(CLICK_SUGGESTION_JS, xpath, needle), timeout) or None
+
+
+def insert_text(driver, element, text: str) -> None:
+    """
+    Replaces the field's text with one CDP Input.insertText call after focusing and selecting
+    it, which fires the input events of a paste rather than one key event per character.
+    Like cdp_eval it targets the top-level document.
+    """
+    driver.execute_script("arguments[0].focus(); if (arguments[0].select) { arguments[0].select(); }", element)
+    driver.execute_cdp_cmd("Input.insertText", {"text": text})
+
+
+def set_select(driver, select, value: str) -> bool:
+    """Selects value in a <select> with one script call (SET_SELECT_JS); False if no option has it."""
+    return driver.execute_script(SET_SELECT_JS, select, value)
+
+
+def debug_screenshot(driver, path: str) -> None:
+    """
+    Saves a screenshot to path when CRAWLER_DEBUG is set; does nothing otherwise. Captured
+    as JPEG through CDP, which is much cheaper to encode and transfer than the PNG from
+    save_screenshot.
+    """
+    if CRAWLER_DEBUG:
+        shot = driver.execute_cdp_cmd("Page.captureScreenshot", {"format": "jpeg", "quality": 60})
+        with open(path, "wb") as f:
+            f.write(base64.b64decode(shot["data"]))
+        print(f"Screenshot saved to {path}")
+
+
+def capture_requests(driver) -> None:
+    """Installs REQUEST_CAPTURE_JS in the current document and in every document loaded after it."""
+    driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": REQUEST_CAPTURE_JS})
+    driver.execute_script(REQUEST_CAPTURE_JS)
+
+
+def cached_page_source(driver, state=None) -> str:
+    """
+    Returns the page source, skipping serializing the whole DOM again when the page state
+    (PAGE_STATE_JS, which includes the URL and a hash of the markup) is unchanged since the
+    driver's last fetch.
+    Pass state when it has just been read.
+    """
+    state = state or driver.execute_script(PAGE_STATE_JS)
+    cached = page_source_cache.get(driver.session_id)
+    if cached and cached[0] == state:
+        return cached[1]
+    source = driver.page_source
+    page_source_cache[driver.session_id] = (state, source)
+    return source
+
+
+def page_tree(driver):
+    """
+    Parses the current page source into an lxml tree. Text-only lookups run against the
+    snapshot, so reading a table costs one transfer instead of a round trip per row and cell.
+    """
+    return lxml.html.fromstring(cached_page_source(driver))
+
+
+@functools.lru_cache(maxsize=128)
+def compiled_xpath(expr: str) -> etree.XPath:
+    """Compiles expr once for lxml; repeated and ad-hoc queries reuse the compiled form."""
+    return etree.XPath(expr)
+
+
+def unique_first_n(items, n: int) -> list:
+    """The first n distinct items in order, consuming items (which may be lazy) only as far as needed."""
+    seen = {}
+    for item in items:
+        seen[item] = None
+        if len(seen) == n:
+            break
+    return list(seen)
+
+
+def node_text(node) -> str:
+    """The text content of an lxml node with whitespace collapsed, like WebElement.text."""
+    return " ".join(node.text_content().split())
+
+
+def css_attribute_selector(tag: str, attribute: str, value: str) -> str:
+    """Builds a tag[attribute="value"] selector, escaping the value for a quoted CSS string."""
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'{tag}[{attribute}="{escaped}"]'
+
+
+def snapshot_inputs(driver, root, xpath: str) -> list:
+    """
+    Evaluates xpath against an lxml parse of root's outerHTML, then fetches the matching
+    inputs back as WebElements with one CSS query built from their id or name. Matches
+    with neither attribute cannot be located again and are skipped.
+    """
+    tree = lxml.html.fromstring(driver.execute_script("return arguments[0].outerHTML;", root))
+    selectors = []
+    for node in compiled_xpath(xpath)(tree):
+        for attribute in ("id", "name"):
+            if node.get(attribute):
+                selectors.append(css_attribute_selector(node.tag, attribute, node.get(attribute)))
+                break
+    if not selectors:
+        return []
+    return root.find_elements(By.CSS_SELECTOR, ", ".join(dict.fromkeys(selectors)))
+
+
+def wait_for(driver, condition, timeout=10, poll_frequency=WAIT_POLL_FREQUENCY):
+    """
+    Waits until condition(driver) is truthy and returns its value, or False on timeout.
+    Used instead of fixed sleeps so the crawler continues as soon as the page is ready.
+    The condition is checked before the first sleep, so a satisfied condition costs one poll.
+    """
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=poll_frequency).until(condition)
+    except TimeoutException:
+        return False
+
+
+def wait_for_page_update(driver, before, timeout=5) -> bool:
+    """
+    Waits until the page state (PAGE_STATE_JS) differs from before and has stopped changing
+    between two polls, so that results loaded after a click have settled. Returns False
+    on timeout. Replaces fixed sleeps after actions that update the page.
+    """
+    last_state = [before]
+
+    def settled(d):
+        state = d.execute_script(PAGE_STATE_JS)
+        is_settled = state != before and state == last_state[0]
+        last_state[0] = state
+        return is_settled
+    return wait_for(driver, settled, timeout)
+
+
+def wait_for_page_settled(driver, timeout=2) -> bool:
+    """
+    Waits until the page state (PAGE_STATE_JS) is the same on two consecutive polls, e.g. for
+    scripts reacting to filled-in fields to finish before a submit. Unlike wait_for_page_update
+    it does not require a change, so a page that is already quiet costs a single poll interval.
+    Returns False on timeout.
+    """
+    last_state = [None]
+
+    def settled(d):
+        state = d.execute_script(PAGE_STATE_JS)
+        is_settled = state == last_state[0]
+        last_state[0] = state
+        return is_settled
+    return wait_for(driver, settled, timeout)
+
+
+def wait_network_idle(driver, timeout=10, quiet_period=0.5) -> bool:
+    """
+    Waits until the document has loaded completely and no further resource request has
+    finished for quiet_period seconds, the polling counterpart of CDP's networkIdle lifecycle event
+    (which execute_cdp_cmd cannot subscribe to). Polls through cdp_eval, so it runs in the
+    top-level document. Returns False on timeout.
+    """
+    last = {"count": None, "since": time.monotonic()}
+
+    def idle(d):
+        ready_state, request_count = cdp_eval(d, NETWORK_STATE_JS)
+        now = time.monotonic()
+        if request_count != last["count"]:
+            last["count"], last["since"] = request_count, now
+        return ready_state == "complete" and now - last["since"] >= quiet_period
+    return wait_for(driver, idle, timeout)
+
+
+def click_and_wait(driver, element, timeout=5) -> bool:
+    """Clicks the element with JavaScript, then waits for the page to update instead of sleeping."""
+    before = driver.execute_script(PAGE_STATE_JS)
+    driver.execute_script("arguments[0].click();", element)
+    return wait_for_page_update(driver, before, timeout)
+
+
+def click_and_wait_until(driver, element, condition, timeout=5):
+    """
+    Clicks the element with JavaScript, then waits for condition(driver) rather than for the
+    whole page to settle. Returns the condition's value, or False on timeout.
+    """
+    driver.execute_script("arguments[0].click();", element)
+    return wait_for(driver, condition, timeout)
+
+
+def click_first_visible(driver, elements, timeout=5, enabled=False):
+    """
+    Clicks the first displayed element (and, with enabled, the first that is not disabled)
+    in one script call rather than filtering, reading and clicking in separate round-trips,
+    then waits up to timeout for the page to update (not at all with a timeout of 0).
+    Returns the clicked element's text, or None if none was visible.
+    """
+    if not elements:
+        return None
+    before = driver.execute_script(PAGE_STATE_JS) if timeout else None
+    clicked = driver.execute_script(CLICK_FIRST_VISIBLE_JS, elements, enabled)
+    if clicked is not None and timeout:
+        wait_for_page_update(driver, before, timeout)
+    return clicked
+
+
+def click_and_wait_for_results(driver, element, action_xpath: str, timeout=10) -> bool:
+    """
+    Clicks a search control, then waits until the page has changed and shows results: a rate
+    (RESULT_MARKER_RE) or an element matching action_xpath. Both are checked in the one
+    SEARCH_STATE_JS call per poll, so the flow moves on as soon as the results render.
+    """
+    before = driver.execute_script(SEARCH_STATE_JS, RESULT_MARKER_RE.pattern, action_xpath)
+    before.pop("results")
+    driver.execute_script("arguments[0].click();", element)
+
+    def results_shown(d):
+        state = d.execute_script(SEARCH_STATE_JS, RESULT_MARKER_RE.pattern, action_xpath)
+        return state.pop("results") and state != before
+    return wait_for(driver, results_shown, timeout)
+
+
+def first_scan_match(driver, queries):
+    """Returns the first element matched by a ranked SCAN_PAGE_JS query list, or None."""
+    elements = driver.execute_script(SCAN_PAGE_JS, {"match": queries})["match"]["elements"]
+    return elements[0] if elements else None
+
+
+class CachedLocator:
+    """
+    Resolves an element once with find(driver) and reuses it, like a page object's cached
+    lookup. call() runs an action on the element and, if a postback has replaced it
+    (StaleElementReferenceException), looks it up again and retries once.
+    """
+    def __init__(self, driver, find, element=None):
+        self.driver = driver
+        self.find = find
+        self.element = element
+
+    def get(self):
+        if self.element is None:
+            self.element = self.find(self.driver)
+        return self.element
+
+    def invalidate(self):
+        self.element = None
+
+    def call(self, action):
+        try:
+            return action(self.get())
+        except StaleElementReferenceException:
+            self.invalidate()
+            return action(self.get())
+
+
+@functools.lru_cache(maxsize=None)
+def image_button_xpath(keywords: tuple, src_patterns: tuple) -> str:
+    """Builds (once per keyword set) the XPath matching <img> buttons by alt text keyword or src pattern."""
+    alt_conditions = " or ".join(f"contains({LOWER_ALT}, '{kw.lower()}')" for kw in keywords)
+    src_conditions = " or ".join(f"contains(@src, '{pattern}')" for pattern in src_patterns)
+    return f"//img[{alt_conditions} or {src_conditions}]"
+
+
+def find_and_click_image_buttons(driver, keywords=IMAGE_BUTTON_KEYWORDS, src_patterns=IMAGE_BUTTON_SRC_PATTERNS, wait_time=3):
+    """
+    Find and click image buttons based on alt text keywords or src patterns.
+    
+    Args:
+        driver: The WebDriver instance
+        keywords: Keywords to search for in alt text
+        src_patterns: Patterns to search for in src attribute
+        wait_time: Longest time to wait for the page to update after clicking
+        
+    Returns:
+        bool: True if an image button was found and clicked, False otherwise
+    """
+    xpath = image_button_xpath(tuple(keywords), tuple(src_patterns))
+    
+    try:
+        images = driver.find_elements(By.XPATH, xpath)
+        
+        if images:
+            for img in visible_elements(driver, images):
+                alt_text = img.get_attribute("alt") or ""
+                src = img.get_attribute("src") or ""
+                print(f"Found image button with alt text: '{alt_text}' and src: {src}")
+                click_and_wait(driver, img, wait_time)
+                print(f"Clicked on image button: {alt_text or src}")
+                return True
+    except Exception as e:
+        print(f"Error finding/clicking image buttons: {str(e)}")
+    
+    return False
+
+
+# --------------------------------------------------------------------------------
+# Form Values
+# --------------------------------------------------------------------------------
+# Field kinds recognised from a field's name, id and placeholder
+FIELD_KIND_RE = re.compile(r"(?P<email>email)|(?P<phone>phone)|(?P<name>name|user)|(?P<message>message|comment|description)|(?P<address>address)")
+# Lowercased name/id (and placeholder) text marking a field as the login identifier: filled
+# with the email value first, or with a username-like value on small login forms
+EMAIL_FIELD_HINT_RE = re.compile("email|user")
+LOGIN_FIELD_HINT_RE = re.compile("user|email|login|account")
+
+# Random value generators for each field kind
+FIELD_VALUE_GENERATORS = {
+    "digits": lambda: ''.join(random.choices(string.digits, k=10)),
+    "word": fake.word,
+    "email": fake.email,
+    "phone": fake.phone_number,
+    "password": lambda: fake.password(length=12),
+    "date": fake.date,
+    "name": fake.name,
+    "message": lambda: fake.paragraph(nb_sentences=2),
+    "address": fake.address,
+    "text": lambda: fake.text(max_nb_chars=20),
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def classify_field(name_id_placeholder: str, input_type: str, pattern: str) -> str:
+    """Returns the FIELD_VALUE_GENERATORS kind for a field; forms often repeat the same field shapes."""
+    if pattern:
+        if "10" in pattern:
+            return "digits"
+        elif "[a-zA-Z]" in pattern:
+            return "word"
+    kinds = {match.lastgroup for match in FIELD_KIND_RE.finditer(name_id_placeholder)}
+    if "email" in kinds:
+        return "email"
+    if "phone" in kinds or "tel" in input_type:
+        return "phone"
+    if input_type == "password":
+        return "password"
+    if input_type == "date":
+        return "date"
+    for kind in ("name", "message", "address"):
+        if kind in kinds:
+            return kind
+    return "text"
+
+
+# --------------------------------------------------------------------------------
+# Tool Result Cache
+# --------------------------------------------------------------------------------
+tool_cache: Dict[str, str] = {}
+tool_cache_lock = threading.Lock()
+# Calls currently running, so that concurrent identical calls share one result
+in_flight_tool_calls: Dict[str, Future] = {}
+
+
+def cached_tool_result(func=None, *, key_args=None):
+    """
+    Caches a deterministic tool's result keyed by a hash of the tool name and its arguments,
+    or of whatever key_args(*args, **kwargs) returns when given, so that calls differing only
+    in ways the tool ignores share an entry while the tool still gets the arguments as passed.
+    Concurrent identical calls wait for the first one instead of repeating the work.
+    Error results are not cached so that transient failures can be retried.
+    """
+    if func is None:
+        return functools.partial(cached_tool_result, key_args=key_args)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        key_source = key_args(*args, **kwargs) if key_args else (args, sorted(kwargs.items()))
+        key = hashlib.sha256(repr((func.__name__, key_source)).encode("utf-8")).hexdigest()
+        with tool_cache_lock:
+            if key in tool_cache:
+                return tool_cache[key]
+            future = in_flight_tool_calls.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                in_flight_tool_calls[key] = future
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            with tool_cache_lock:
+                in_flight_tool_calls.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with tool_cache_lock:
+            in_flight_tool_calls.pop(key, None)
+            if not result.startswith(("Error", "Failed")):
+                tool_cache[key] = result
+        future.set_result(result)
+        return result
+    return wrapper
+
+
+# --------------------------------------------------------------------------------
+# Tools
+# --------------------------------------------------------------------------------
+def search_cache_key(query: str) -> str:
+    """Cache key for a search: queries differing only in case or spacing share a result."""
+    return " ".join(query.lower().split())
+
+
+# Only the cache key is normalized; the query is sent as written, since operators like OR are case-sensitive
+@cached_tool_result(key_args=search_cache_key)
+def search_duckduckgo(query: str) -> str:
+    """
+    Searches DuckDuckGo for the given query string, returning up to 10 results.
+    """
+    try:
+        with DDGS() as ddgs:
+            results = list(ddgs.text(query, max_results=10))
+        if not results:
+            return "No results found."
+        response = f"Search results for '{query}':\n"
+        for i, result in enumerate(results, 1):
+            response += (
+                f"{i}. Title: {result['title']}\n"
+                f"   Summary: {result['body']}\n"
+                f"   Link: {result['href']}\n"
+            )
+        return response
+    except Exception as e:
+        return f"Error performing search: {str(e)}"
+
+
+async def search_duckduckgo_async(query: str) -> str:
+    """
+    Runs the DuckDuckGo search in a worker thread so that several searches can overlap.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, search_duckduckgo, query)
+
+
+internet_searcher = StructuredTool.from_function(
+    func=search_duckduckgo,
+    coroutine=search_duckduckgo_async,
+    name="internet_searcher",
+)
+
+
+def scrape_page(url: str) -> str:
+    """
+    Loads the given URL in an Undetected ChromeDriver from the scraper pool and returns the page source.
+    """
+    try:
+        cookies = shared_session_cookies()
+        with get_scraper_pool().browser() as browser:
+            # The shared browser's session, so pages behind the agent's login aren't scraped logged out
+            browser.set_cookies(cookies)
+            browser.go_to_url(url)
+            content = browser.get_page_source()
+        if content and len(content.strip()) > 0:
+            return content
+        else:
+            return "No content could be extracted from the page."
+    except Exception as uc_error:
+        return f"Error scraping with undetected-chromedriver: {str(uc_error)}"
+
+
+async def scrape_page_async(url: str) -> str:
+    """
+    Runs the page load in a worker thread, so that pages requested in the same agent turn load
+    side by side in the scraper pool's browsers, alongside any searches.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, scrape_page, url)
+
+
+web_scraper = StructuredTool.from_function(
+    func=scrape_page,
+    coroutine=scrape_page_async,
+    name="web_scraper",
+)
+
+
+def extract_pdf_text(data: bytes) -> str:
+    """
+    Extracts the text of every page in a PDF. Uses the pdftotext binary when available,
+    then PyMuPDF, then pypdf, and finally pdfplumber.
+    """
+    if PDFTOTEXT:
+        try:
+            result = subprocess.run(
+                [PDFTOTEXT, "-layout", "-", "-"],
+                input=data,
+                capture_output=True,
+                timeout=30,
+            )
+            if result.returncode == 0:
+                return result.stdout.decode("utf-8", "ignore")
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+
+    # Pages are read one after another: PyMuPDF is not thread-safe and holds the GIL while
+    # extracting, so worker threads would only add risk
+    if fitz is not None:
+        with fitz.open(stream=data, filetype="pdf") as doc:
+            return "\n".join(page.get_text("text") for page in doc)
+
+    # Scanned or unusual PDFs that pypdf gets no text from go on to pdfminer/pdfplumber
+    if PdfReader is not None:
+        pdf_text = "\n".join(page.extract_text() or "" for page in PdfReader(io.BytesIO(data)).pages)
+        if pdf_text.strip():
+            return pdf_text
+
+    if len(data) > LARGE_PDF_BYTES:
+        return pdfminer_extract_text(io.BytesIO(data))
+
+    pdf_text = ""
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                pdf_text += page_text + "\n"
+    return pdf_text
+
+
+def read_pdf_cache(name: str):
+    """Returns the contents of a file in PDF_CACHE_DIR, or None if it is missing or unreadable."""
+    try:
+        with open(os.path.join(PDF_CACHE_DIR, name), encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def write_pdf_cache(name: str, content: str):
+    """Writes a file in PDF_CACHE_DIR atomically; the cache is best effort, so failures are ignored."""
+    try:
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        path = os.path.join(PDF_CACHE_DIR, name)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+    except OSError:
+        pass
+
+
+@cached_tool_result
+def scrape_pdf(url: str) -> str:
+    """
+    Downloads a PDF from the given URL and extracts its text contents.
+    """
+    try:
+        too_large = f"PDF is too large to process (over {MAX_PDF_BYTES // (1024 * 1024)} MB)."
+        not_pdf = "Failed to download PDF, the URL did not return a PDF document."
+        headers = {"Accept": "application/pdf"}
+        
+        # Revalidate the last download of this URL instead of fetching it again, as long as
+        # its extracted text is still on disk
+        url_entry_name = f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+        url_entry = json.loads(read_pdf_cache(url_entry_name) or "{}")
+        cached_text = read_pdf_cache(f"{url_entry['sha256']}.txt") if url_entry.get("sha256") else None
+        if cached_text is not None:
+            if url_entry.get("etag"):
+                headers["If-None-Match"] = url_entry["etag"]
+            if url_entry.get("last_modified"):
+                headers["If-Modified-Since"] = url_entry["last_modified"]
+        
+        with http_session.get(url, timeout=15, stream=True, headers=headers) as response:
+            if response.status_code == 304 and cached_text is not None:
+                return cached_text or "No text extracted from PDF."
+            if response.status_code != 200:
+                return f"Failed to download PDF, status code: {response.status_code}"
+            # Skip the download entirely when the announced size is already over the limit
+            if int(response.headers.get("Content-Length") or 0) > MAX_PDF_BYTES:
+                return too_large
+            buffer = io.BytesIO()
+            total = 0
+            header_checked = False
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                total += len(chunk)
+                if total > MAX_PDF_BYTES:
+                    return too_large
+                buffer.write(chunk)
+                if not header_checked and total >= PDF_HEADER_BYTES:
+                    header_checked = True
+                    if PDF_MAGIC not in buffer.getvalue()[:PDF_HEADER_BYTES]:
+                        return not_pdf
+        data = buffer.getvalue()
+        if PDF_MAGIC not in data[:PDF_HEADER_BYTES]:
+            return not_pdf
+        
+        # The same document may already have been extracted from another URL
+        content_hash = hashlib.sha256(data).hexdigest()
+        pdf_text = read_pdf_cache(f"{content_hash}.txt")
+        if pdf_text is None:
+            pdf_text = extract_pdf_text(data).strip()
+            write_pdf_cache(f"{content_hash}.txt", pdf_text)
+        write_pdf_cache(url_entry_name, json.dumps({
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "sha256": content_hash,
+        }))
+        return pdf_text if pdf_text else "No text extracted from PDF."
+    except Exception as e:
+        return f"Error parsing PDF: {str(e)}"
+
+
+async def scrape_pdf_async(url: str) -> str:
+    """
+    Runs the PDF download and extraction in a worker thread so that several PDFs can be fetched at once.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, scrape_pdf, url)
+
+
+pdf_scraper = StructuredTool.from_function(
+    func=scrape_pdf,
+    coroutine=scrape_pdf_async,
+    name="pdf_scraper",
+)
+
+
+@tool
+def go_to_url_tool(url: str) -> str:
+    """
+    Directs the browser to navigate to the specified URL (no content extraction).
+    """
+    get_browser().go_to_url(url)
+    return f"Navigated to {url}"
+
+
+@tool
+def get_page_source_tool(arg: str = "") -> str:
+    """
+    Returns the current page source from the undetected ChromeDriver.
+    """
+    return get_browser().get_page_source()
+
+
+@tool
+def shutdown_browser_tool(arg: str = "") -> str:
+    """
+    Shuts down the browser session (closes the undetected ChromeDriver).
+    """
+    shutdown_browser()
+    return "Browser has been shut down."
+
+
+@tool
+def fill_every_form_tool(arg: Dict[str, str] = None) -> str:
+    """
+    Fills every form on the current page with data extracted by the LLM from user input,
+    or realistic random text if no data is provided, and dynamically identifies/submits.
+    Particularly effective for login forms if an email is provided.
+    Args:
+        arg (Dict[str, str], optional): Dictionary of field names and values extracted by the LLM.
+                                        For login forms, it's best to include "email" key.
+    Returns:
+        str: Detailed summary of actions taken.
+    """
+    browser = get_browser()
+    driver = browser.driver
+    wait = WebDriverWait(driver, browser.wait_time, poll_frequency=WAIT_POLL_FREQUENCY)
+
+    def guess_input_value(field, custom_data=None, email_value=None, visible_inputs=None):
+        """Generate input value using LLM-extracted data if provided, otherwise use realistic random data.
+
+        custom_data is expected with lowercased keys and email_value already picked out of it,
+        both prepared once per call rather than once per field; visible_inputs is the form's
+        visible text-like inputs, computed once per form.
+        """
+        input_type = field["type"]
+        name_id_placeholder = (
+            field["name"].lower() +
+            field["id"].lower() +
+            field["placeholder"].lower()
+        ).strip()
+        pattern = field["pattern"]
+
+        if custom_data:
+            # For email fields, prioritize email values regardless of field name
+            if email_value and ("email" in name_id_placeholder or input_type == "email"):
+                return email_value
+            
+            # Dynamic form detection - identify login-like forms with minimal inputs
+            # Check for simple forms with few inputs - common for login forms
+            if visible_inputs is not None and len(visible_inputs) <= 3:  # If there are only a few input fields visible
+                # First try the email from the data for a likely email field
+                if email_value:
+                    return email_value
+                
+                # If no email in custom data, look at field attributes to determine likely type
+                for visible_input in visible_inputs:
+                    name_attrs = (
+                        visible_input["name"].lower() +
+                        visible_input["id"].lower() +
+                        visible_input["placeholder"].lower()
+                    )
+                    
+                    # For username/email field check
+                    if LOGIN_FIELD_HINT_RE.search(name_attrs):
+                        for key, value in custom_data.items():
+                            if isinstance(value, str) and ("@" in value or "user" in key):
+                                return value
+            
+            # Check for a data key contained in the field's name, id or placeholder
+            for key, value in custom_data.items():
+                if key in name_id_placeholder:
+                    return value
+
+        return FIELD_VALUE_GENERATORS[classify_field(name_id_placeholder, input_type, pattern)]()
+
+    def find_parent_clickable(element):
+        """Find the nearest clickable parent (e.g., button or div), walked in one script call."""
+        return driver.execute_script(CLICKABLE_PARENT_JS, element)
+
+    def submit_candidates(root, form):
+        """Elements under root that could submit form, judged in the browser in one call."""
+        return driver.execute_script(SUBMIT_CANDIDATES_JS, root, form, SUBMIT_TEXT_RE.pattern, SUBMIT_CANDIDATE_CSS)
+
+    def submission_state(driver):
+        """URL, form and login field counts, text hash and success match, read in one script call."""
+        return driver.execute_script(SUBMISSION_STATE_JS, *SUBMISSION_COUNT_SELECTORS, SUCCESS_INDICATOR_RE.pattern)
+
+    def detect_submission_change(driver):
+        """Check if a submission occurred by looking for URL changes, form count changes, or success messages."""
+        try:
+            initial = submission_state(driver)
+            
+            # Return as soon as the URL, form count or login fields change, or a success message
+            # appears in changed text, instead of sleeping a fixed time
+            def page_changed(d):
+                state = submission_state(d)
+                return (state["url"] != initial["url"] or state["formCount"] != initial["formCount"]
+                        or state["loginFieldCount"] < initial["loginFieldCount"]
+                        or (state["bodyHash"] != initial["bodyHash"] and state["hasSuccess"]))
+            try:
+                WebDriverWait(driver, SUBMISSION_TIMEOUT, poll_frequency=WAIT_POLL_FREQUENCY).until(page_changed)
+            except TimeoutException:
+                pass
+            
+            final = submission_state(driver)
+            initial_url, new_url = initial["url"], final["url"]
+            initial_form_count, new_form_count = initial["formCount"], final["formCount"]
+            # For login detection, check if email/username fields disappeared
+            initial_login_fields, new_login_fields = initial["loginFieldCount"], final["loginFieldCount"]
+            login_success = initial_login_fields > 0 and new_login_fields < initial_login_fields
+            
+            # A success message only counts if the visible text actually changed
+            source_changed = final["bodyHash"] != initial["bodyHash"] and final["hasSuccess"]
+            
+            result = new_url != initial_url or new_form_count != initial_form_count or source_changed or login_success
+            
+            if result:
+                change_reasons = []
+                if new_url != initial_url:
+                    change_reasons.append(f"URL changed from {initial_url} to {new_url}")
+                if new_form_count != initial_form_count:
+                    change_reasons.append(f"Form count changed from {initial_form_count} to {new_form_count}")
+                if source_changed:
+                    change_reasons.append("Success indicator found in page text")
+                if login_success:
+                    change_reasons.append(f"Login fields reduced from {initial_login_fields} to {new_login_fields}")
+                
+                summary.append(f"Submission change detected: {', '.join(change_reasons)}")
+            
+            return result
+        except Exception as e:
+            summary.append(f"Error in detect_submission_change: {str(e)}")
+            return False
+
+    summary = []
+
+    # Initial wait for page load
+    browser.wait_until_ready()
+
+    # Navigate to contact/login form if requested
+    try:
+        # Look for login links or forms first
+        login_links = wait_for(driver, lambda d: d.execute_script(CASE_TEXT_MATCH_JS, "*", LOGIN_LINK_KEYWORDS), 5)
+        
+        if login_links:
+            for state in element_states(driver, login_links):
+                if state["visible"] and state["enabled"]:
+                    link = state["element"]
+                    scroll_click(driver, link)
+                    summary.append("[main page] Clicked potential 'login/sign in' link to access form.")
+                    # Wait for form elements - look specifically for email or username inputs
+                    WebDriverWait(driver, browser.wait_time, poll_frequency=WAIT_POLL_FREQUENCY).until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, LOGIN_FIELD_CSS))
+                    )
+                    break
+        else:
+            # Fallback to looking for contact links
+            contact_links = wait_for(driver, lambda d: d.execute_script(CASE_TEXT_MATCH_JS, "*", CONTACT_LINK_KEYWORDS), 5)
+            if contact_links:
+                for state in element_states(driver, contact_links):
+                    if state["visible"] and state["enabled"]:
+                        link = state["element"]
+                        scroll_click(driver, link)
+                        summary.append("[main page] Clicked potential 'contact' link to access form.")
+                        WebDriverWait(driver, 5, poll_frequency=WAIT_POLL_FREQUENCY).until(
+                            EC.presence_of_element_located((By.TAG_NAME, "form"))
+                        )
+                        break
+    except Exception as e:
+        summary.append(f"[main page] Error navigating to form: {str(e)}")
+
+    # Check main context and iframes. All frames are summarised in one call, and same-origin
+    # frames without any form fields are skipped without switching into them.
+    contexts = [(None, "main page")]
+    try:
+        for frame in driver.execute_script(FRAME_SUMMARY_JS):
+            if frame["fields"] != 0:
+                contexts.append((frame["element"], f"iframe '{frame['id'] or 'unnamed'}'"))
+    except Exception as e:
+        summary.append(f"Error accessing iframes: {str(e)}")
+
+    form_count = 0
+    submitted_forms = 0
+
+    # Normalize the custom data once; keys are matched case-insensitively against every field
+    custom_data = {str(key).lower(): value for key, value in (arg or {}).items()}
+    # Prioritize email fields first if we have an email in arg (basic email format check)
+    email_value = next((value for value in custom_data.values()
+                        if isinstance(value, str) and "@" in value and "." in value), None)
+
+    for frame, context_name in contexts:
+        if frame is not None:
+            try:
+                driver.switch_to.frame(frame)
+            except:
+                continue
+
+        # Check for success page immediately to avoid redundant processing
+        if driver.execute_script(PAGE_TEXT_TEST_JS, THANK_YOU_RE.pattern):
+            summary.append(f"[{context_name}] Detected 'Thank you' page; submission already successful.")
+            submitted_forms += 1
+            break
+
+        forms = driver.find_elements(By.TAG_NAME, "form")
+        if not forms:
+            forms = [driver.find_element(By.TAG_NAME, "body")]
+
+        for form_index, form in enumerate(forms):
+            form_count += 1
+            # Tag the form so it can still be found for submission if this handle goes stale
+            form_key = str(form_count)
+            # Radio groups already handled in this form; only one button per group is selected
+            visited_radio_groups = set()
+
+            # First pass: identify all email fields using multiple strategies
+            email_fields = []
+            # One round-trip returns every field together with the attributes we need
+            all_fields = driver.execute_script(FORM_FIELDS_JS, form, form_key)
+            # Visible text-like inputs, counted once per form to spot short login forms
+            visible_inputs = [f for f in all_fields
+                              if f["tag"] == "input" and f["visible"] and f["type"] not in ["hidden", "submit", "button"]]
+            
+            # Try to find fields that are specifically for email
+            for field in all_fields:
+                # Check the type, then name and id for "email" or related terms in one search
+                if field["type"] == "email" or EMAIL_FIELD_HINT_RE.search(f'{field["name"]} {field["id"]}'.lower()):
+                    email_fields.append(field["element"])
+            
+            # General approach for finding email fields by nearby labels
+            try:
+                # All lookups are scoped to the current form rather than the whole document.
+                # Covers table layouts with the label in one cell and the input in another,
+                # label elements, and accessibility-focused aria-label/placeholder text
+                for probe in driver.execute_script(PROBE_JS, EMAIL_LABEL_PROBES, form):
+                    email_fields.extend(match["element"] for match in probe)
+                
+                # For sites that put the label text right before the input, resolved against
+                # a snapshot of the form rather than one driver query per label node
+                email_fields.extend(snapshot_inputs(driver, form, EMAIL_LABEL_INPUT_XPATH))
+            except:
+                pass
+
+            # Deduplicate by WebElement id, a local string, so membership checks need no WebDriver round-trips
+            email_fields = list({email_field.id: email_field for email_field in email_fields}.values())
+            email_field_ids = {email_field.id for email_field in email_fields}
+            
+            # If we have both email value and fields, fill them first
+            if email_value and email_fields:
+                for state in element_states(driver, email_fields):
+                    try:
+                        email_field = state["element"]
+                        if state["visible"] and state["enabled"]:
+                            fill_field(driver, email_field, email_value)
+                            summary.append(f"[{context_name}] Filled email field with '{email_value}'.")
+                    except Exception as e:
+                        summary.append(f"[{context_name}] Error filling email field: {str(e)}")
+            
+            # Now fill all inputs with LLM-extracted or random data
+            for field in all_fields:
+                inp = field["element"]
+                itype = field["type"]
+                try:
+                    if itype == "hidden":
+                        continue
+                    if not field["enabled"]:
+                        continue
+                    if not field["visible"]:
+                        driver.execute_script("arguments[0].style.display = 'block';", inp)
+                        summary.append(f"[{context_name}] Forced visibility of {itype} input.")
+                    
+                    # Skip email fields we already filled
+                    if email_value and inp.id in email_field_ids:
+                        continue
+
+                    if itype == "checkbox":
+                        if not field["checked"]:
+                            inp.click()
+                        summary.append(f"[{context_name}] Checked a checkbox.")
+                    elif itype == "radio":
+                        radio_name = field["name"]
+                        if radio_name and radio_name not in visited_radio_groups:
+                            if not field["checked"]:
+                                inp.click()
+                            visited_radio_groups.add(radio_name)
+                            summary.append(f"[{context_name}] Selected radio button '{radio_name}'.")
+                    elif itype in ["button", "submit", "reset", "file"]:
+                        continue
+                    else:
+                        value = guess_input_value(field, custom_data, email_value, visible_inputs)
+                        fill_field(driver, inp, value)
+                        summary.append(f"[{context_name}] Filled input ({itype}) with '{value}'.")
+                except Exception as e:
+                    summary.append(f"[{context_name}] Error filling input ({itype}): {str(e)}")
+
+            # Let validation and other scripts triggered by the filled values settle before submitting
+            wait_for_page_settled(driver)
+
+            # Dynamically detect and click the submit button
+            submitted = False
+            potential_buttons = []
+            try:
+                potential_buttons = submit_candidates(form, form)
+
+                if not potential_buttons:
+                    potential_buttons = submit_candidates(None, form)
+
+                for btn in potential_buttons:
+                    try:
+                        clickable = find_parent_clickable(btn["element"])
+                        clicked_tag = scroll_click(driver, clickable)
+                        summary.append(f"[{context_name}] Attempted submission by clicking candidate: '{btn['text']}' (tag: {clicked_tag})")
+                        if detect_submission_change(driver):
+                            summary.append(f"[{context_name}] Submission detected after clicking '{btn['text']}'.")
+                            submitted = True
+                            submitted_forms += 1
+                            break
+                    except Exception as e:
+                        summary.append(f"[{context_name}] Error clicking candidate '{btn['text']}': {str(e)}")
+            except Exception as e:
+                summary.append(f"[{context_name}] Error detecting submit button: {str(e)}")
+
+            # Fallback: Enter key
+            if not submitted:
+                text_inputs = form.find_elements(By.CSS_SELECTOR, TEXT_INPUT_CSS)
+                if text_inputs:
+                    try:
+                        text_inputs[0].send_keys(Keys.ENTER)
+                        summary.append(f"[{context_name}] Submitted form by sending Enter key.")
+                        if detect_submission_change(driver):
+                            submitted = True
+                            submitted_forms += 1
+                    except Exception as e:
+                        summary.append(f"[{context_name}] Error sending Enter: {str(e)}")
+
+            # Fallback: JavaScript submission, locating the form by the key it was tagged with.
+            # The main page goes through CDP directly; frames need WebDriver's frame focus.
+            if not submitted:
+                try:
+                    if frame is None:
+                        js_submitted = cdp_eval(driver, SUBMIT_FORM_JS, form_key, form_index)
+                    else:
+                        js_submitted = driver.execute_script(SUBMIT_FORM_JS, form_key, form_index)
+                    if js_submitted:
+                        summary.append(f"[{context_name}] Submitted form using JavaScript requestSubmit().")
+                        if detect_submission_change(driver):
+                            submitted = True
+                            submitted_forms += 1
+                except Exception as e:
+                    summary.append(f"[{context_name}] JavaScript submission failed: {str(e)}")
+
+            # Stop as soon as a submission is confirmed, noting a success page if there is one
+            if submitted:
+                if driver.execute_script(PAGE_TEXT_TEST_JS, THANK_YOU_RE.pattern):
+                    summary.append(f"[{context_name}] Confirmed 'Thank you' page after submission.")
+                break
+
+            # Last resort: Click the first few visible clickable-looking elements
+            try:
+                for elem in driver.execute_script(CLICKABLE_CANDIDATES_JS, LAST_RESORT_CLICK_LIMIT):
+                    clickable = find_parent_clickable(elem["element"])
+                    clicked_tag = scroll_click(driver, clickable)
+                    summary.append(f"[{context_name}] Last resort click on '{elem['text']}' (tag: {clicked_tag})")
+                    if detect_submission_change(driver):
+                        submitted = True
+                        submitted_forms += 1
+                        break
+            except Exception as e:
+                summary.append(f"[{context_name}] Last resort click failed: {str(e)}")
+
+            if submitted:
+                break
+
+        driver.switch_to.default_content()
+        if submitted_forms > 0:
+            break
+
+    return f"Detected {form_count} form(s) across contexts, submitted {submitted_forms}:\n" + "\n".join(summary)
+
+
+# --------------------------------------------------------------------------------
+# Create the Agent
+# --------------------------------------------------------------------------------
+@functools.lru_cache(maxsize=None)
+def get_chat() -> ChatOpenAI:
+    """Builds the chat model once, on a shared keep-alive HTTP client, so every agent reuses its connections."""
+    limits = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    return ChatOpenAI(
+        temperature=0,
+        model="gpt-4o",
+        http_client=httpx.Client(timeout=60, limits=limits),
+        http_async_client=httpx.AsyncClient(timeout=60, limits=limits),
+    )
+
+
+SYSTEM_PROMPT = """
+You are a helpful assistant with access to these tools to interact with web content:
+1) internet_searcher(query: str) - Search the web for information
+2) web_scraper(url: str) - Retrieve the HTML content of a webpage in a separate browser that shares the session's cookies; it does not navigate the interactive browser
+3) pdf_scraper(url: str) - Extract text from PDF documents
+4) go_to_url_tool(url: str) - Navigate the browser to a specific URL
+5) get_page_source_tool() - Get the current page's HTML content
+6) shutdown_browser_tool() - Close the browser properly
+7) fill_every_form_tool() - Intelligently fill forms with extracted or random data
+
+General Instructions:
+- Extract URLs from user requests to navigate to websites using 'go_to_url_tool'
+- 'web_scraper' only reads a page; to fill forms or inspect a page with 'get_page_source_tool', first open it with 'go_to_url_tool'
+- Identify and extract key information from user requests such as:
+  * Email addresses and login credentials
+  * Product codes (HS codes, HTS codes, etc.)
+  * Country names and requirements
+  * Specific tasks to perform (searching, form filling, information extraction)
+- Use 'fill_every_form_tool' to handle forms, passing extracted data as a dictionary via the 'arg' parameter
+- IMPORTANT: When detecting an email address, always extract it with "email" as the key (e.g., {"email": "user@example.com"})
+- Extract any other field-value pairs from user instructions (e.g., names, quantities, descriptions)
+- For unknown values, pass an empty dictionary to use realistic random data
+- For search and lookup operations, extract search terms and navigate through appropriate UI elements
+- When navigating sites, look for relevant links, tabs, and buttons that match the user's goals
+- When success is achieved, report details of exactly what was found or accomplished
+- Include screenshots or extracted content as appropriate to show results
+- The crawler is designed to handle a wide variety of websites and form structures dynamically
+
+For specific duty/tariff lookups:
+- Extract product codes (e.g., HS codes like 9018.19.10) and countries (e.g., Brazil)
+- Navigate to the appropriate search fields and enter the codes
+- Look for country selection options and select the target country
+- Find and extract duty rates, which are often displayed as percentages
+- Report the complete findings with context about the product and applicable rates
+"""
+
+TOOLS = [
+    internet_searcher,
+    web_scraper,
+    pdf_scraper,
+    go_to_url_tool,
+    get_page_source_tool,
+    shutdown_browser_tool,
+    fill_every_form_tool
+]
+
+
+@functools.lru_cache(maxsize=None)
+def create_agent():
+    """Compiles the agent graph once; later calls share it, along with its conversation memory."""
+    return create_react_agent(
+        model=get_chat(),
+        tools=TOOLS,
+        prompt=SYSTEM_PROMPT,
+        checkpointer=MemorySaver(),
+    )
+
+# --------------------------------------------------------------------------------
+# Tariff Lookup
+# --------------------------------------------------------------------------------
+def duty_table_findings(tree) -> list:
+    """
+    (label, text) findings from the tables in tree: every row of a table whose headers name
+    a duty or rate, and otherwise the individual rows that mention one.
+    """
+    findings = []
+    for table in TABLES_XPATH(tree):
+        header_text = " ".join([node_text(h) for h in TABLE_HEADERS_XPATH(table)]).lower()
+        
+        # If headers contain relevant keywords, this is likely our table
+        if any(keyword in header_text for keyword in ['duty', 'tariff', 'rate', 'tax', 'charge']):
+            findings.append(("Found table with relevant headers", header_text))
+            for row in TABLE_ROWS_XPATH(table):
+                cells = ROW_CELLS_XPATH(row)
+                if cells:
+                    findings.append(("Row data", " ".join([node_text(cell) for cell in cells])))
+        else:
+            # Check individual rows for duty rate information
+            for row in TABLE_ROWS_XPATH(table):
+                row_text = " ".join([node_text(cell) for cell in ROW_CELLS_XPATH(row)]).lower()
+                if any(keyword in row_text for keyword in ['duty', 'tariff', 'rate', 'tax', 'import charge', 'percentage']):
+                    findings.append(("Found potential duty rate information", row_text))
+    return findings
+
+
+def country_cell_pattern(country: str) -> str:
+    """
+    Case-insensitive pattern for a cell or value naming country: its name as a whole word,
+    or exactly one of its COUNTRY_CODES.
+    """
+    codes = COUNTRY_CODES.get(country.lower(), [])
+    return "|".join([rf"\b{re.escape(country)}\b"] + [f"^{re.escape(code)}$" for code in codes])
+
+
+def country_rate_rows(tree, hs_code: str, country: str) -> list:
+    """
+    (row text, percentages) for each row of tree's hs_code tables that names country, or is
+    labelled with one of its codes, next to a rate. One XPath evaluation covers what the
+    duties tab and Brazil element walk in lookup_tariff otherwise find click by click.
+    The country name must appear as a whole word in a cell ("Brazilian nut" doesn't count)
+    and a code must be a cell's whole text. Cells are read separately, as in
+    duty_table_findings, so numbers in adjacent cells don't run into one rate.
+    """
+    found = []
+    for row in COUNTRY_RATE_ROWS_XPATH(tree, code=hs_code, country=country_cell_pattern(country)):
+        cells = [node_text(cell) for cell in ROW_CELLS_XPATH(row)]
+        percentages = [match for cell in cells for match in PERCENT_RE.findall(cell)]
+        if percentages:
+            found.append((" ".join(cells), percentages))
+    return found
+
+
+def extract_duty_info(html: str, hs_code: str, country: str) -> dict:
+    """
+    Reads duty information out of a page's HTML with lxml, without going back to the browser.
+    Returns the rates listed for country against hs_code (see country_rate_rows), the first
+    five distinct percentages, the number of tables, the duty terms mentioned, and as
+    findings the (label, text, percentages in text) results of the first fallback scan that
+    turns anything up: duty keyword text, rate tables, rate text, and finally any element
+    showing a percentage.
+    """
+    tree = lxml.html.fromstring(html)
+    page_text = " ".join(PAGE_TEXT_XPATH(tree))
+    
+    findings = [("Duty-related information", node_text(e))
+                for e in OWN_TEXT_MATCH_XPATH(tree, pattern="|".join(DUTY_TEXT_KEYWORDS))]
+    if not findings:
+        findings = duty_table_findings(tree)
+    if not findings:
+        rate_texts = [node_text(e) for e in OWN_TEXT_MATCH_XPATH(tree, pattern="|".join(DUTY_RATE_KEYWORDS))]
+        findings = [("Found text with duty/rate information", text)
+                    for text in rate_texts if len(text) > 3]  # Avoid empty or very short texts
+    if not findings:
+        findings = [("Found element with percentage", node_text(e))
+                    for e in compiled_xpath(PERCENT_TEXT_XPATH)(tree)]
+    
+    return {
+        "country_rates": country_rate_rows(tree, hs_code, country),
+        "percentages": unique_first_n((m.group() for m in PERCENT_RE.finditer(html)), 5),
+        "table_count": len(TABLES_XPATH(tree)),
+        "terms": list(dict.fromkeys(m.lower() for m in DUTY_TERMS_RE.findall(page_text))),
+        "findings": [(label, text, PERCENT_RE.findall(text)) for label, text in findings],
+    }
+
+
+def lookup_tariff(driver, hs_code: str, country: str) -> bool:
+    """
+    Searches the tariff site open in driver for hs_code imported into country and prints
+    the duty information it finds. Returns True if any duty rate information was found.
+    """
+    # Look for HS Code input field using various approaches
+    print("Searching for HS Code input field...")
+    
+    # The HS code tiers and the country dropdown and input lookups all run in one
+    # round-trip; for the HS code field the first tier with a match wins
+    form_scan = driver.execute_script(SCAN_PAGE_JS, TARIFF_FORM_SCAN)
+    hs_lookup = form_scan["hs_code"]
+    hs_code_fields = hs_lookup["elements"]
+    if hs_code_fields:
+        print(f"Found HS Code field by {HS_CODE_FIELD_TIERS[hs_lookup['tier']]['label']}")
+    country_selects = form_scan["country_select"]["elements"]
+    country_fields = form_scan["country_text"]["elements"]
+    
+    # Keep the fields found above, re-finding them only if a search or
+    # country postback replaces them before they are used again
+    hs_locator = CachedLocator(driver, lambda d: first_scan_match(d, HS_CODE_FIELD_TIERS), hs_code_fields[0]) if hs_code_fields else None
+    country_select_locator = CachedLocator(driver, lambda d: first_scan_match(d, TARIFF_FORM_SCAN["country_select"]), country_selects[0]) if country_selects else None
+    country_field_locator = CachedLocator(driver, lambda d: first_scan_match(d, TARIFF_FORM_SCAN["country_text"]), country_fields[0]) if country_fields else None
+    
+    # Fill in HS Code if field found
+    if hs_code_fields:
+        hs_field = hs_code_fields[0]
+        field_id = hs_field.get_attribute("id") or hs_field.get_attribute("name") or "unknown"
+        print(f"Found HS code field: {field_id}")
+        driver.execute_script("arguments[0].scrollIntoView(true);", hs_field)
+        
+        # Enhanced handling for fields that might not be interactable
+        # This applies to all sites, not just specific ones
+        if field_id in ["txtSearchCode", "search", "query", "code", "lookup"] or not hs_field.is_enabled():
+            try:
+                # Make the element interactable using JavaScript
+                driver.execute_script(
+                    "arguments[0].style.display = 'block'; " +
+                    "arguments[0].style.visibility = 'visible'; " +
+                    "arguments[0].style.opacity = '1'; " +
+                    "arguments[0].disabled = false; " +
+                    "arguments[0].readOnly = false;", 
+                    hs_field
+                )
+                
+                # Set the value using JavaScript - works even with disabled fields
+                driver.execute_script("arguments[0].value = arguments[1];", hs_field, hs_code)
+                print(f"Set search code using JavaScript: {hs_code}")
+                search_state = driver.execute_script(PAGE_STATE_JS)
+                
+                # Look for search button with multiple approaches
+                search_buttons = driver.find_elements(By.XPATH, SEARCH_CONTROL_XPATH)
+                
+                if search_buttons:
+                    # Try to find the most relevant search button
+                    clicked = click_first_visible(driver, search_buttons, timeout=0)
+                    if clicked is not None:
+                        print(f"Clicked search button: {clicked}")
+                else:
+                    # Try submitting the field's form, found and submitted in one call
+                    if driver.execute_script(SUBMIT_CLOSEST_FORM_JS, hs_field) == "submitted":
+                        print("Submitted form")
+                    else:
+                        # Last resort: press Enter
+                        try:
+                            hs_field.send_keys(Keys.ENTER)
+                            print("Sent ENTER key to field")
+                        except:
+                            print("Could not submit search in any way")
+                
+                # Wait for the search results rather than a fixed delay
+                wait_for_page_update(driver, search_state, 5)
+            except Exception as js_error:
+                print(f"Error with JavaScript approach: {str(js_error)}")
+                # Fallback to regular approach
+                try:
+                    insert_text(driver, hs_field, hs_code)
+                    print(f"Entered code using fallback: {hs_code}")
+                    # Only the trailing Enter is sent as a real key event
+                    hs_field.send_keys(Keys.ENTER)
+                except Exception as fallback_error:
+                    print(f"Error with fallback approach: {str(fallback_error)}")
+        else:
+            # Regular approach for other sites
+            hs_field.clear()
+            hs_field.send_keys(hs_code)
+            
+            # Additional debugging
+            print(f"Entered HS code: {hs_code} into field {field_id}")
+        
+        # Check for autocomplete or suggestions after entering HS code
+        try:
+            suggestion = click_suggestion(driver, SUGGESTION_ITEM_XPATH, hs_code)
+            if suggestion:
+                print(f"Clicked autocomplete suggestion: {suggestion}")
+        except Exception as auto_error:
+            print(f"Error handling HS code autocomplete: {str(auto_error)}")
+    else:
+        print("No HS code field found - this might be an issue with the site structure")
+    
+    # Select or input country
+    country_state = driver.execute_script(PAGE_STATE_JS)
+    if country_selects:
+        # If dropdown, select Brazil
+        # The HS code search may have posted back, so re-find the dropdown if it went stale
+        country_select_name = country_select_locator.call(lambda e: e.get_attribute('id') or e.get_attribute('name'))
+        country_select = country_select_locator.get()
+        print(f"Found country dropdown: {country_select_name}")
+        # Known country codes are tried first, each with one script call
+        selected_code = next((code for code in COUNTRY_CODES.get(country.lower(), []) if set_select(driver, country_select, code)), None)
+        if selected_code:
+            print(f"Selected {country} from dropdown by code {selected_code}")
+        else:
+            # Read every option's index, text and value in one call and pick the best match in
+            # Python, so no Select command is issued just to find out that it fails: the exact
+            # label, then a partial label, then a value containing the country's name or a code
+            options = driver.execute_script(SELECT_OPTIONS_JS, country_select)
+            codes = COUNTRY_CODES.get(country.lower(), [])
+            match = (
+                next((o for o in options if o[1].strip() == country), None)
+                or next((o for o in options if country.lower() in o[1].lower()), None)
+                or next((o for o in options if o[2] and (country.lower() in o[2].lower() or any(code in o[2] for code in codes))), None)
+            )
+            try:
+                if match:
+                    idx, text, value = match
+                    print(f"Selected {country} from dropdown: option {idx} ({text})")
+                    Select(country_select).select_by_index(idx)
+                else:
+                    # Last resort: use JavaScript to set the value
+                    print("Using JavaScript to set dropdown value")
+                    
+                    # Enhanced dynamic country selection for all sites
+                    try:
+                        # First try looking for any country-related elements with the target country name
+                        country_elements = driver.execute_script(CASE_TEXT_MATCH_JS, "*", [country.lower()])
+                        country_element = next((s for s in element_states(driver, country_elements) if s["visible"]), None)
+                        
+                        # Only if no name matched, look for country codes (2-letter and 3-letter
+                        # codes), one at a time and stopping at the first visible match
+                        for code_xpath in COUNTRY_CODE_XPATHS.get(country.lower(), []):
+                            if country_element:
+                                break
+                            code_elements = driver.find_elements(By.XPATH, code_xpath)
+                            country_element = next((s for s in element_states(driver, code_elements) if s["visible"]), None)
+                        
+                        # Click the first visible matching country element
+                        if country_element:
+                            print(f"Found country element: {country_element['text']}")
+                            click_and_wait(driver, country_element["element"], 1)
+                        
+                        # Look for any duty/tariff/tax related elements
+                        duty_elements = driver.execute_script(CASE_TEXT_MATCH_JS, "*", DUTY_KEYWORDS)
+                        
+                        # Try clicking on any duty-related elements
+                        clicked = click_first_visible(driver, duty_elements, 2, enabled=True)
+                        if clicked is not None:
+                            print(f"Clicked duty/tariff element: {clicked}")
+                                
+                        # Look for toggle/expand elements that might reveal more info
+                        toggles = driver.find_elements(By.CSS_SELECTOR, TOGGLE_CSS)
+                        
+                        # Try clicking on any toggle elements
+                        for toggle in visible_elements(driver, toggles, enabled=True):
+                            print(f"Clicking toggle/expand element")
+                            click_and_wait(driver, toggle, 1)
+                    except Exception as dynamic_error:
+                        print(f"Error with dynamic country handling: {str(dynamic_error)}")
+                    # The clicks above may have reloaded the form, so re-find the dropdown if needed
+                    country_select_locator.call(lambda e: set_select(driver, e, "BR"))  # Common value for Brazil
+            except Exception as js_error:
+                print(f"All dropdown selection methods failed: {str(js_error)}")
+        # Give a selection-triggered postback a moment to land
+        wait_for_page_update(driver, country_state, 1)
+    elif country_fields:
+        # The HS code search may have posted back, so re-find the field if it went stale
+        country_field_name = country_field_locator.call(lambda e: e.get_attribute('id') or e.get_attribute('name'))
+        country_field = country_field_locator.get()
+        print(f"Found country field: {country_field_name}")
+        driver.execute_script("arguments[0].scrollIntoView(true);", country_field)
+        country_field.clear()
+        country_field.send_keys(country)
+        
+        # Look for autocomplete suggestions after typing
+        try:
+            suggestion = click_suggestion(driver, AUTOCOMPLETE_ITEM_XPATH, country)
+            if suggestion:
+                print(f"Clicked autocomplete suggestion: {suggestion}")
+                wait_for_page_update(driver, country_state, 1)
+        except Exception as auto_error:
+            print(f"Error handling autocomplete: {str(auto_error)}")
+    else:
+        # If no specific country field found, look for any likely fields
+        print("No standard country field found, looking for alternatives")
+        
+        # Look for any inputs or spans that might be a country selector. The condition
+        # returns the (possibly empty) match list, so a hit ends the wait on the first poll.
+        country_elements = wait_for(driver, lambda d: d.find_elements(By.XPATH, COUNTRY_FIELD_FALLBACK_XPATH), 1) or []
+        
+        if country_elements:
+            elem = country_elements[0]
+            print(f"Found potential country element: {elem.tag_name}")
+            
+            if elem.tag_name == "input":
+                elem.clear()
+                elem.send_keys(country)
+            elif elem.is_displayed() and elem.is_enabled():
+                click_and_wait(driver, elem, 1)
+                
+                # After clicking, look for a dropdown or input
+                dropdown_options = driver.find_elements(By.XPATH, "//li[contains(text(), 'Brazil')]")
+                click_first_visible(driver, dropdown_options, timeout=0)
+        else:
+            print("No country field found")
+    
+    # Look for search/submit buttons, falling back to any button in the same call.
+    # Scanned again here because filling the fields may have updated the page.
+    search_buttons = driver.execute_script(SCAN_PAGE_JS, SEARCH_BUTTON_SCAN)["search"]["elements"]
+    
+    # Click search button
+    if search_buttons:
+        for button in visible_elements(driver, search_buttons, enabled=True):
+            print(f"Clicking search button: {button.text or button.get_attribute('value')}")
+            # After clicking search, wait for a rate or an action button to appear rather
+            # than for the page to settle
+            click_and_wait_for_results(driver, button, image_button_xpath(ACTION_KEYWORDS, ACTION_SRC_PATTERNS))
+            
+            # Use our helper method with general action keywords that would work across sites
+            find_and_click_image_buttons(
+                driver, 
+                keywords=ACTION_KEYWORDS, 
+                src_patterns=ACTION_SRC_PATTERNS,
+                wait_time=3
+            )
+            break
+    else:
+        # If no button found, try pressing Enter in the last field used
+        print("No search button found, trying Enter key")
+        enter_state = driver.execute_script(PAGE_STATE_JS)
+        if country_fields:
+            country_field_locator.call(lambda e: e.send_keys(Keys.ENTER))
+        elif hs_locator:
+            hs_locator.call(lambda e: e.send_keys(Keys.ENTER))
+        wait_for_page_update(driver, enter_state, 5)
+    
+    # Extract and display the duty rate information
+    print("\nSearching for duty rate information in page...\n")
+    duty_rate_found = False
+    
+    # Generic data extraction for duty/tariff sites
+    print("Using intelligent data extraction for duty/tariff information")
+    
+    # Common structure across tariff lookup sites:
+    # 1. First search for a product code and get results with description
+    # 2. Often need to access specific tabs or sections (Duties, Tariffs, Taxes)
+    # 3. May need to select or filter by country
+    
+    try:
+        # First, take screenshots for debugging
+        debug_screenshot(driver, f"/tmp/hs_{hs_code}.jpg")
+        
+        # Check if we're on the Global Tariff page or need to navigate to it
+        if "GlobalTariffs" not in driver.current_url:
+            global_tariff_links = driver.find_elements(By.XPATH, GLOBAL_TARIFF_LINK_XPATH)
+            if global_tariff_links:
+                clicked = click_first_visible(driver, global_tariff_links, 3)
+                if clicked is not None:
+                    print(f"Clicked link to Global Tariffs: {clicked}")
+            
+        # Now look for the search field on the Global Tariffs page
+        try:
+            # Try to find search input fields in a general way
+            # First look for common product/HS code field patterns
+            search_field = None
+            search_field_candidates = driver.find_elements(By.XPATH, PRODUCT_CODE_FIELD_XPATH)
+            
+            if search_field_candidates:
+                search_field = search_field_candidates[0]
+            else:
+                # Fallback: try to find any text input field
+                text_inputs = driver.find_elements(By.XPATH, "//input[@type='text']")
+                if text_inputs:
+                    search_field = text_inputs[0]
+            
+            # Need to check if search field is in an iframe, unless one is already visible
+            # in the main document (each frame costs two switches)
+            iframes = []
+            if search_field is None or not visible_elements(driver, [search_field]):
+                iframes = driver.find_elements(By.TAG_NAME, "iframe")
+            if iframes:
+                for iframe in iframes:
+                    try:
+                        driver.switch_to.frame(iframe)
+                        search_fields = driver.find_elements(By.ID, "txtSearchCode")
+                        if search_fields and search_fields[0].is_displayed():
+                            search_field = search_fields[0]
+                            break
+                        driver.switch_to.default_content()
+                    except:
+                        driver.switch_to.default_content()
+            
+            # Ensure the field is interactable
+            driver.execute_script(
+                "arguments[0].style.display = 'block'; " +
+                "arguments[0].style.visibility = 'visible'; " +
+                "arguments[0].disabled = false; " +
+                "arguments[0].readOnly = false;", 
+                search_field
+            )
+            
+            # Enter the HS code using JavaScript
+            driver.execute_script("arguments[0].value = arguments[1];", search_field, hs_code)
+            print(f"Set HS code using JavaScript: {hs_code}")
+            
+            # Find and click the search button in a general way
+            search_button = None
+            
+            # Try multiple approaches to find a search button
+            (search_button_candidates,) = driver.execute_script(PROBE_JS, SEARCH_BUTTON_PROBE)
+            
+            if search_button_candidates:
+                search_button = search_button_candidates[0]["element"]
+            else:
+                # Fallback to any button near the search field
+                try:
+                    # Look for buttons near our search field
+                    nearby_buttons = search_field.find_elements(By.XPATH, "..//button | ../..//button | ../following::button[1]")
+                    if nearby_buttons:
+                        search_button = nearby_buttons[0]
+                except:
+                    pass
+            search_state = driver.execute_script(PAGE_STATE_JS)
+            if search_button:
+                driver.execute_script("arguments[0].click();", search_button)
+                print("Clicked search button")
+            else:
+                # Try pressing Enter in the search field as a last resort
+                search_field.send_keys(Keys.ENTER)
+                print("Used Enter key to submit search")
+            
+            # After clicking search, wait for the page to update before looking for action buttons
+            wait_for_page_update(driver, search_state, 3)
+            
+            # Use our helper method with general action keywords for any site
+            find_and_click_image_buttons(
+                driver, 
+                keywords=RESULT_ACTION_KEYWORDS, 
+                src_patterns=RESULT_ACTION_SRC_PATTERNS,
+                wait_time=5
+            )
+        except Exception as search_error:
+            print(f"Error during search: {str(search_error)}")
+            
+        # First check if we found the HS code
+        hs_code_found = False
+        
+        # Look for result tables with the HS code in a snapshot of the page; Selenium is
+        # only used below for the elements that get clicked
+        tree = page_tree(driver)
+        result_tables = RESULT_TABLE_XPATH(tree, code=hs_code)
+        matched_code = hs_code
+        if not result_tables:
+            # Try with just the beginning of the HS code 
+            matched_code = hs_code[:6] if len(hs_code) > 6 else hs_code
+            result_tables = RESULT_TABLE_XPATH(tree, code=matched_code)
+        
+        if result_tables:
+            hs_code_found = True
+            print("Found HS code in search results")
+            
+            # Fast path: when the results already list a rate for the country, that answers
+            # the lookup and none of the clicking and scanning below is needed
+            country_rates = country_rate_rows(tree, matched_code, country)
+            for row_text, rates in country_rates:
+                print(f"🌟 Found duty rates for {country}: {', '.join(rates)} ({row_text})")
+            if country_rates:
+                return True
+            
+            # Try to click on the HS code to open details if it's a link
+            hs_code_links = driver.find_elements(By.XPATH, f"//a[contains(text(), '{hs_code}')]")
+            # The tables come from the snapshot taken before the click, so they can still be read
+            # if the link opens another page
+            clicked = click_first_visible(driver, hs_code_links, 3)
+            link_clicked = clicked is not None
+            if link_clicked:
+                print(f"Clicked HS code link: {clicked}")
+            
+            for table in result_tables:
+                print("Found table with HS code information:")
+                for row in TABLE_ROWS_XPATH(table):
+                    cells = ROW_CELLS_XPATH(row)
+                    if cells:
+                        row_text = " ".join([node_text(cell) for cell in cells])
+                        print(f"HS Code info: {row_text}")
+                        duty_rate_found = True
+            
+            if link_clicked:
+                tree = page_tree(driver)
+            
+            # Probe the detail view's clickable controls in one pass; the country dropdowns and
+            # Calculate buttons are looked up again only if a duties tab click changes the page
+            detail_scan = driver.execute_script(SCAN_PAGE_JS, DETAIL_VIEW_SCAN)
+            tab_clicked = False
+            
+            # Check if we're in product detail view
+            # The site shows HS Code hierarchy with specific formatting
+            hs_code_header = compiled_xpath(HS_CODE_HEADER_XPATH)(tree)
+            
+            if hs_code_header:
+                print(f"Found HS code detail view: {node_text(hs_code_header[0])}")
+                
+                # Find any description elements 
+                description_elems = compiled_xpath(DESCRIPTION_TEXT_XPATH)(tree)
+                
+                for elem in description_elems:
+                    print(f"Product description: {node_text(elem)}")
+                    duty_rate_found = True
+                
+                # Check if Duties and Taxes tab is available
+                duties_tab = detail_scan["duties_tab"]["elements"]
+                
+                if duties_tab:
+                    for tab in visible_elements(driver, duties_tab, enabled=True):
+                        print("Found 'Duties and Taxes' tab")
+                        try:
+                            tab_clicked = True
+                            # The tab is expected to reveal Brazil specific information, so wait
+                            # for that rather than for the page to settle
+                            brazil_elements = click_and_wait_until(
+                                driver, tab, lambda d: d.find_elements(By.XPATH, BRAZIL_TEXT_XPATH), 3
+                            ) or []
+                            print(f"Clicked on tab: {tab.text}")
+                            
+                            # Take another screenshot after clicking the tab
+                            debug_screenshot(driver, f"/tmp/hs_{hs_code}_after_duties_tab_click.jpg")
+                            
+                            for brazil_elem in visible_elements(driver, brazil_elements):
+                                # Check if it's clickable, then wait for duty rates near this
+                                # element, up to 5 levels up
+                                try:
+                                    parents = click_and_wait_until(
+                                        driver, brazil_elem,
+                                        lambda d: brazil_elem.find_elements(By.XPATH, PERCENT_ANCESTOR_XPATH), 2
+                                    ) or []
+                                    print(f"Clicked on Brazil element: {brazil_elem.text}")
+                                except Exception as brazil_click_error:
+                                    print(f"Could not click Brazil element: {str(brazil_click_error)}")
+                                    parents = []
+                                
+                                parent_text = parents[0].text if parents else ""
+                                if "%" in parent_text:
+                                    print(f"Found percentage in parent context: {parent_text}")
+                                    duty_rate_found = True
+                                    
+                                    # Extract all percentages
+                                    percentages = PERCENT_RE.findall(parent_text)
+                                    if percentages:
+                                        print(f"🌟 Found duty rates for Brazil: {', '.join(percentages)}")
+                                        
+                                # Look for nearby elements with percentage signs, within the element's
+                                # own row (the nearest match comes last in document order)
+                                rows = brazil_elem.find_elements(By.XPATH, ENCLOSING_ROW_XPATH)
+                                nearby_percentages = rows[-1].find_elements(By.XPATH, LOCAL_PERCENT_TEXT_XPATH) if rows else []
+                                
+                                for pct_elem in visible_elements(driver, nearby_percentages):
+                                    print(f"Found percentage element near Brazil: {pct_elem.text}")
+                                    duty_rate_found = True
+                                    break
+                        except Exception as tab_click_error:
+                            print(f"Error clicking duties tab: {str(tab_click_error)}")
+                        
+                        # Check if it's already selected
+                        if "selected" not in tab.get_attribute("class"):
+                            print("Clicking on Duties and Taxes tab")
+                            click_and_wait(driver, tab, 2)
             
-            # General approach for finding email fields by nearby labels
-            try:
-                # For sites that use table layouts with label in one cell and input in another
-                email_label_fields = driver.find_elements(By.XPATH, 
-                    "//td[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email')]/following-sibling::td/input")
-                email_fields.extend(email_label_fields)
+            # Look for Country selection dropdowns
+            if tab_clicked:
+                detail_scan = driver.execute_script(SCAN_PAGE_JS, DETAIL_VIEW_SCAN)
+            country_dropdowns = detail_scan["country_dropdowns"]["elements"]
+            
+            if country_dropdowns:
+                print("Found country selection dropdowns")
                 
-                # For sites that use label elements - more general approach for all sites
-                labeled_fields = driver.find_elements(By.XPATH, 
-                    "//label[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email')]/following-sibling::input | " +
-                    "//label[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email')]/input")
-                email_fields.extend(labeled_fields)
+                # Check if there's a Calculate button
+                calc_buttons = detail_scan["calc_buttons"]["elements"]
                 
-                # For accessibility-focused sites that use aria-label
-                aria_fields = driver.find_elements(By.XPATH, 
-                    "//input[contains(translate(@aria-label, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email') or " +
-                    "contains(translate(@placeholder, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email')]")
-                email_fields.extend(aria_fields)
+                # Try regular buttons first
+                button_clicked = click_first_visible(driver, calc_buttons, 2) is not None
+                if button_clicked:
+                    print("Clicked Calculate button")
                 
-                # For sites that put the label text right before the input
-                text_nodes = driver.find_elements(By.XPATH, "//*[contains(text(), 'Email')]")
-                for node in text_nodes:
-                    # Find nearby input elements
-                    nearby_inputs = node.find_elements(By.XPATH, "./following::input[position() < 3]")
-                    email_fields.extend(nearby_inputs)
-            except:
-                pass
+                # If no regular button found/clicked, try image buttons
+                if not button_clicked:
+                    button_clicked = find_and_click_image_buttons(
+                        driver, 
+                        keywords=DUTY_ACTION_KEYWORDS, 
+                        src_patterns=RESULT_ACTION_SRC_PATTERNS,
+                        wait_time=2
+                    )
             
-            # If we have both email value and fields, fill them first
-            if email_value and email_fields:
-                for email_field in email_fields:
-                    try:
-                        if email_field.is_displayed() and email_field.is_enabled():
-                            driver.execute_script("arguments[0].scrollIntoView(true);", email_field)
-                            email_field.clear()
-                            email_field.send_keys(email_value)
-                            time.sleep(0.5)  # Short pause after filling email
-                            summary.append(f"[{context_name}] Filled email field with '{email_value}'.")
-                    except Exception as e:
-                        summary.append(f"[{context_name}] Error filling email field: {str(e)}")
+            # Provide a summary of the general workflow followed
+            print("\nGeneral workflow summary:")
+            print("1. Logged in to the website using provided credentials")
+            print("2. Navigated to the appropriate search page")
+            print("3. Entered search criteria including product code and country")
+            print("4. Looked for action buttons and relevant data on result pages")
+            print("5. Analyzed any tables, percentage values, and tariff information")
             
-            # Now fill all inputs with LLM-extracted or random data
-            for inp in all_inputs:
-                try:
-                    itype = (inp.get_attribute("type") or "").lower()
-                    if itype == "hidden":
-                        continue
-                    if not inp.is_enabled():
-                        continue
-                    if not inp.is_displayed():
-                        driver.execute_script("arguments[0].style.display = 'block';", inp)
-                        summary.append(f"[{context_name}] Forced visibility of {itype} input.")
-                    
-                    # Skip email fields we already filled
-                    if email_value and inp in email_fields:
-                        continue
+            # Add information about what was found
+            if hs_code:
+                print(f"\nSearched for product code: {hs_code}")
+            if country:
+                print(f"Searched for import country: {country}")
+        
+    except Exception as e:
+        print(f"Error in site-specific extraction: {str(e)}")
+    
+    # Everything from here on only reads the page, so it is parsed from one snapshot
+    info = {"country_rates": [], "percentages": [], "table_count": 0, "terms": [], "findings": []}
+    try:
+        info = extract_duty_info(cached_page_source(driver), hs_code, country)
+    except Exception as e:
+        print(f"Error analyzing page content: {str(e)}")
+    
+    for row_text, rates in info["country_rates"]:
+        print(f"🌟 Found duty rates for {country}: {', '.join(rates)} ({row_text})")
+        duty_rate_found = True
+    if info["percentages"]:
+        print("\nFound potential duty/tax rates in the content:")
+        print(", ".join(info["percentages"]))  # Display unique rates, limit to 5
+    if info["table_count"]:
+        print("\nFound tables that might contain duty information")
+    for term in info["terms"]:
+        print(f"Found '{term}' references in the content")
+    duty_rate_found = duty_rate_found or bool(info["percentages"]) or bool(info["table_count"])
+    
+    # Otherwise report what the fallback scans turned up
+    if not duty_rate_found:
+        for label, text, rates in info["findings"]:
+            print(f"{label}: {text}")
+            if rates:
+                print(f"🌟 Found percentage values: {', '.join(rates)}")
+            duty_rate_found = True
+    
+    # If all extraction methods failed
+    if not duty_rate_found:
+        print("Could not find specific duty rate information on the page.")
+    
+    # Keep the page for manual analysis when debugging
+    if not duty_rate_found and CRAWLER_DEBUG:
+        try:
+            debug_screenshot(driver, "/tmp/duty_rate_page.jpg")
+        except Exception as ss_error:
+            print(f"Error saving screenshot: {str(ss_error)}")
+        
+        # Get page source for offline analysis
+        try:
+            with open("/tmp/page_source.html", "w") as f:
+                f.write(cached_page_source(driver))
+            print("Page source saved to /tmp/page_source.html for offline analysis")
+        except Exception as ps_error:
+            print(f"Error saving page source: {str(ps_error)}")
 
-                    if itype == "checkbox":
-                        if not inp.is_selected():
-                            inp.click()
-                        summary.append(f"[{context_name}] Checked a checkbox.")
-                    elif itype == "radio":
-                        radio_name = inp.get_attribute("name")
-                        if radio_name and radio_name not in locals().get('visited_radio_groups', set()):
-                            if not inp.is_selected():
-                                inp.click()
-                            locals().setdefault('visited_radio_groups', set()).add(radio_name)
-                            summary.append(f"[{context_name}] Selected radio button '{radio_name}'.")
-                    elif itype in ["button", "submit", "reset", "file"]:
-                        continue
-                    else:
-                        value = guess_input_value(inp, arg)
-                        inp.clear()
-                        inp.send_keys(value)
-                        summary.append(f"[{context_name}] Filled input ({itype}) with '{value}'.")
-                except Exception as e:
-                    summary.append(f"[{context_name}] Error filling input ({itype}): {str(e)}")
+    return duty_rate_found
 
-            # Delay before submission
-            time.sleep(2)
 
-            # Dynamically detect and click the submit button
-            submitted = False
-            potential_buttons = []
-            try:
-                candidates = form.find_elements(By.XPATH, ".//*[self::button or self::input or self::div or self::span or self::a]")
-                for candidate in candidates:
-                    if candidate.is_displayed() and candidate.is_enabled() and is_submit_candidate(candidate, form):
-                        potential_buttons.append(candidate)
+def find_lookup_endpoints(requests_made: list, hs_code: str) -> list:
+    """
+    The requests (from CAPTURED_REQUESTS_JS) that carried hs_code in their URL or body, latest
+    first, since autocomplete requests come before the search. Analytics and logging calls can
+    carry the code too, so each is only a candidate until a replay of it returns rates.
+    """
+    return [r for r in reversed(requests_made) if hs_code in r["url"] or hs_code in (r["body"] or "")]
 
-                if not potential_buttons:
-                    nearby_candidates = driver.find_elements(By.XPATH, "//*[self::button or self::input or self::div or self::span or self::a]")
-                    for candidate in nearby_candidates:
-                        if candidate.is_displayed() and candidate.is_enabled() and is_submit_candidate(candidate, form):
-                            potential_buttons.append(candidate)
 
-                for btn in potential_buttons:
-                    try:
-                        clickable = find_parent_clickable(btn)
-                        driver.execute_script("arguments[0].scrollIntoView(true);", clickable)
-                        driver.execute_script("arguments[0].click();", clickable)
-                        summary.append(f"[{context_name}] Attempted submission by clicking candidate: '{btn.text}' (tag: {clickable.tag_name})")
-                        if detect_submission_change(driver):
-                            summary.append(f"[{context_name}] Submission detected after clicking '{btn.text}'.")
-                            submitted = True
-                            submitted_forms += 1
-                            break
-                        time.sleep(2)
-                    except Exception as e:
-                        summary.append(f"[{context_name}] Error clicking candidate '{btn.text}': {str(e)}")
-            except Exception as e:
-                summary.append(f"[{context_name}] Error detecting submit button: {str(e)}")
+def json_country_rates(data, country: str) -> list:
+    """
+    Percentages from the objects in a JSON reply that name country in one of their plain
+    values (see country_cell_pattern), read from those objects' own values only, so other
+    countries' rates in the same reply are left out.
+    """
+    pattern = re.compile(country_cell_pattern(country), re.IGNORECASE)
+    found = []
 
-            # Fallback: Enter key
-            if not submitted:
-                text_inputs = form.find_elements(By.CSS_SELECTOR, "input[type='text'], input[type='email'], textarea")
-                if text_inputs:
-                    try:
-                        text_inputs[0].send_keys(Keys.ENTER)
-                        summary.append(f"[{context_name}] Submitted form by sending Enter key.")
-                        if detect_submission_change(driver):
-                            submitted = True
-                            submitted_forms += 1
-                        time.sleep(3)
-                    except Exception as e:
-                        summary.append(f"[{context_name}] Error sending Enter: {str(e)}")
+    def walk(node):
+        if isinstance(node, dict):
+            values = [value for value in node.values() if not isinstance(value, (dict, list))]
+            if any(isinstance(value, str) and pattern.search(value.strip()) for value in values):
+                found.extend(match for value in values for match in PERCENT_RE.findall(str(value)))
+            children = node.values()
+        elif isinstance(node, list):
+            children = node
+        else:
+            return
+        for child in children:
+            walk(child)
+    walk(data)
+    return found
 
-            # Fallback: JavaScript submission with retry
-            if not submitted:
-                for _ in range(2):
-                    try:
-                        WebDriverWait(driver, 5).until(EC.presence_of_element_located((By.TAG_NAME, "form")))
-                        form = driver.find_elements(By.TAG_NAME, "form")[forms.index(form)]
-                        driver.execute_script("""
-                            var form = arguments[0];
-                            if (form && typeof form.submit === 'function') {
-                                var event = new Event('submit', { bubbles: true, cancelable: true });
-                                form.dispatchEvent(event);
-                                form.submit();
-                            } else if (form && form.requestSubmit) {
-                                form.requestSubmit();
-                            }
-                        """, form)
-                        summary.append(f"[{context_name}] Submitted form using enhanced JavaScript.")
-                        if detect_submission_change(driver):
-                            submitted = True
-                            submitted_forms += 1
-                        time.sleep(2)
-                        break
-                    except Exception as e:
-                        summary.append(f"[{context_name}] JavaScript submission attempt {_+1} failed: {str(e)}")
-                        time.sleep(1)
 
-            # Check for success page and stop if found
-            if submitted and ("thank you" in driver.page_source.lower() or "your submission" in driver.page_source.lower()):
-                summary.append(f"[{context_name}] Confirmed 'Thank you' page after submission.")
-                break
+def reply_country_rates(response: httpx.Response, hs_code: str, country: str) -> list:
+    """
+    The rates a replayed lookup reply lists for country: from the matching objects of a JSON
+    reply, or from an HTML reply's hs_code table rows (country_rate_rows). Percentages
+    elsewhere in the reply, other countries' or a style's width:100%, are ignored.
+    """
+    if "json" in response.headers.get("content-type", ""):
+        rates = json_country_rates(response.json(), country)
+    elif response.text.strip():
+        tree = lxml.html.fromstring(response.text)
+        rates = [rate for _, row_rates in country_rate_rows(tree, hs_code, country) for rate in row_rates]
+    else:
+        rates = []
+    return unique_first_n(rates, 5)
 
-            # Last resort: Click any nearby button-like element
-            if not submitted:
-                try:
-                    nearby = driver.find_elements(By.XPATH, "//*[self::button or self::input or self::div or self::span or self::a]")
-                    for elem in nearby:
-                        if elem.is_displayed() and elem.is_enabled():
-                            clickable = find_parent_clickable(elem)
-                            driver.execute_script("arguments[0].scrollIntoView(true);", clickable)
-                            driver.execute_script("arguments[0].click();", clickable)
-                            summary.append(f"[{context_name}] Last resort click on '{elem.text}' (tag: {clickable.tag_name})")
-                            if detect_submission_change(driver):
-                                submitted = True
-                                submitted_forms += 1
-                                break
-                            time.sleep(3)
-                except Exception as e:
-                    summary.append(f"[{context_name}] Last resort click failed: {str(e)}")
 
-            if submitted:
-                break
+def same_rates(rates: list) -> set:
+    """rates with spacing removed, for comparing percentages written as '4 %' and '4%'."""
+    return {re.sub(r"\s+", "", rate) for rate in rates}
 
-        driver.switch_to.default_content()
-        if submitted_forms > 0:
-            break
 
-    return f"Detected {form_count} form(s) across contexts, submitted {submitted_forms}:\n" + "\n".join(summary)
+async def replay_lookup(client: httpx.AsyncClient, endpoint: dict, template_code: str, hs_code: str, country: str) -> list:
+    """
+    Sends the captured lookup request again with template_code swapped for hs_code and returns
+    up to five of the rates the response lists for country (empty if none). Raises
+    httpx.HTTPStatusError if the endpoint refuses it.
+    """
+    body = endpoint["body"].replace(template_code, hs_code) if endpoint["body"] else None
+    response = await client.request(
+        endpoint["method"],
+        endpoint["url"].replace(template_code, hs_code),
+        headers=endpoint["headers"],
+        content=body,
+    )
+    response.raise_for_status()
+    return reply_country_rates(response, hs_code, country)
 
 
-# --------------------------------------------------------------------------------
-# Create the Agent
-# --------------------------------------------------------------------------------
-def create_agent():
-    chat = ChatOpenAI(temperature=0, model="gpt-4o")
+async def find_replayable_endpoint(client: httpx.AsyncClient, candidates: list, hs_code: str, country: str, expected_rates: list):
+    """
+    The first candidate whose replay for hs_code, the code the browser just looked up, lists
+    every rate the browser found for country (expected_rates), or None. Checking against a
+    known answer keeps an autocomplete, analytics or all-countries request from being
+    replayed for every other code.
+    """
+    expected = same_rates(expected_rates)
+    for candidate in candidates:
+        try:
+            if expected <= same_rates(await replay_lookup(client, candidate, hs_code, hs_code, country)):
+                return candidate
+        except Exception as e:
+            print(f"Captured request {candidate['method']} {candidate['url']} can't be replayed: {str(e)}")
+    return None
 
-    system_prompt = """
-You are a helpful assistant with access to these tools to interact with web content:
-1) internet_searcher(query: str) - Search the web for information
-2) web_scraper(url: str) - Retrieve the HTML content of a webpage
-3) pdf_scraper(url: str) - Extract text from PDF documents
-4) go_to_url_tool(url: str) - Navigate the browser to a specific URL
-5) get_page_source_tool() - Get the current page's HTML content
-6) shutdown_browser_tool() - Close the browser properly
-7) fill_every_form_tool() - Intelligently fill forms with extracted or random data
 
-General Instructions:
-- Extract URLs from user requests to navigate to websites using 'go_to_url_tool'
-- Identify and extract key information from user requests such as:
-  * Email addresses and login credentials
-  * Product codes (HS codes, HTS codes, etc.)
-  * Country names and requirements
-  * Specific tasks to perform (searching, form filling, information extraction)
-- Use 'fill_every_form_tool' to handle forms, passing extracted data as a dictionary via the 'arg' parameter
-- IMPORTANT: When detecting an email address, always extract it with "email" as the key (e.g., {"email": "user@example.com"})
-- Extract any other field-value pairs from user instructions (e.g., names, quantities, descriptions)
-- For unknown values, pass an empty dictionary to use realistic random data
-- For search and lookup operations, extract search terms and navigate through appropriate UI elements
-- When navigating sites, look for relevant links, tabs, and buttons that match the user's goals
-- When success is achieved, report details of exactly what was found or accomplished
-- Include screenshots or extracted content as appropriate to show results
-- The crawler is designed to handle a wide variety of websites and form structures dynamically
+async def lookup_tariffs(driver, hs_codes: list, country: str) -> dict:
+    """
+    Looks up several HS codes. The first runs in driver, which holds the logged-in session,
+    while the page's XHR/fetch requests are recorded. If replaying one of them for the first
+    code lists the rates the browser found for country, it is replayed over HTTP for the other
+    codes, concurrently and without a browser. Codes it can't answer (no such request, a
+    4xx/5xx reply, or a reply without rates for country) run in pooled browsers that copy driver's cookies and start from the same page;
+    Selenium calls block, so those run in the default executor and the pool bounds how many
+    extra browsers are open. Returns each code's result (or exception).
+    """
+    loop = asyncio.get_running_loop()
+    start_url = driver.current_url
+    cookies = all_cookies(driver)
+    results = {}
 
-For specific duty/tariff lookups:
-- Extract product codes (e.g., HS codes like 9018.19.10) and countries (e.g., Brazil)
-- Navigate to the appropriate search fields and enter the codes
-- Look for country selection options and select the target country
-- Find and extract duty rates, which are often displayed as percentages
-- Report the complete findings with context about the product and applicable rates
-"""
+    capture_requests(driver)
+    try:
+        results[hs_codes[0]] = await loop.run_in_executor(None, lookup_tariff, driver, hs_codes[0], country)
+    except Exception as e:
+        results[hs_codes[0]] = e
 
-    tools = [
-        internet_searcher,
-        web_scraper,
-        pdf_scraper,
-        go_to_url_tool,
-        get_page_source_tool,
-        shutdown_browser_tool,
-        fill_every_form_tool
-    ]
+    remaining = hs_codes[1:]
+    candidates = find_lookup_endpoints(driver.execute_script(CAPTURED_REQUESTS_JS), hs_codes[0])
+    # The rates the browser found for the first code, which a replay must reproduce to be trusted
+    expected_rates = [
+        rate for _, row_rates in country_rate_rows(page_tree(driver), hs_codes[0], country) for rate in row_rates
+    ] if results[hs_codes[0]] is True else []
+    if candidates and remaining and expected_rates:
+        jar = httpx.Cookies()
+        for cookie in cookies:
+            jar.set(cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"))
+        user_agent = driver.execute_script("return navigator.userAgent;")
+        async with httpx.AsyncClient(cookies=jar, headers={"User-Agent": user_agent}, follow_redirects=True) as client:
+            endpoint = await find_replayable_endpoint(client, candidates, hs_codes[0], country, expected_rates)
+            if endpoint:
+                print(f"Replaying the site's lookup request for the other codes: {endpoint['method']} {endpoint['url']}")
+                replies = await asyncio.gather(
+                    *(replay_lookup(client, endpoint, hs_codes[0], hs_code, country) for hs_code in remaining),
+                    return_exceptions=True,
+                )
+            else:
+                replies = []
+        for hs_code, reply in zip(remaining, replies):
+            if isinstance(reply, Exception):
+                print(f"Replay failed for {hs_code} ({str(reply)}), using the browser instead")
+            elif not reply:
+                print(f"Replay found no rates for {hs_code}, using the browser instead")
+            else:
+                print(f"🌟 HS code {hs_code}: found {country} rates: {', '.join(reply)}")
+                results[hs_code] = True
+        remaining = [hs_code for hs_code in remaining if hs_code not in results]
+
+    if remaining:
+        pool = BrowserPool(TARIFF_LOOKUP_WORKERS)
+
+        def lookup_in_pool(hs_code):
+            with pool.browser() as browser:
+                browser.set_cookies(cookies)
+                browser.go_to_url(start_url)
+                return lookup_tariff(browser.driver, hs_code, country)
+
+        try:
+            replies = await asyncio.gather(
+                *(loop.run_in_executor(None, lookup_in_pool, hs_code) for hs_code in remaining),
+                return_exceptions=True,
+            )
+        finally:
+            pool.close()
+        results.update(zip(remaining, replies))
+    return {hs_code: results[hs_code] for hs_code in hs_codes}
 
-    return create_react_agent(
-        model=chat,
-        tools=tools,
-        prompt=system_prompt,
-        checkpointer=MemorySaver(),
-    )
 
 # --------------------------------------------------------------------------------
 # Main
@@ -748,137 +3078,98 @@ if __name__ == "__main__":
         print(f"Processing request: {user_input}")
         
         # Extract email directly for testing
-        import re
-        email_match = re.search(r'[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+', user_input)
+        email_match = EMAIL_RE.search(user_input)
         email = email_match.group(0) if email_match else None
         print(f"Extracted email: {email}")
         
         # Extract URL from user input if present
-        url_match = re.search(r'https?://[^\s]+', user_input)
+        url_match = URL_RE.search(user_input)
         if url_match:
             target_url = url_match.group(0)
             print(f"Found URL in input: {target_url}")
+            browser = get_browser()
             browser.go_to_url(target_url)
-            time.sleep(5)
             
             # Look for login link - general approach for any site
             try:
                 driver = browser.driver
-                # Comprehensive login detection xpath
-                login_xpath = "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'login') or " + \
-                              "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'sign in') or " + \
-                              "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'log in') or " + \
-                              "contains(@href, 'login') or contains(@href, 'signin') or contains(@href, 'account')]"
-                login_links = driver.find_elements(By.XPATH, login_xpath)
+                (login_links,) = driver.execute_script(PROBE_JS, LOGIN_LINK_PROBE)
                 print(f"Found {len(login_links)} login links")
                 
-                if login_links:
-                    for link in login_links:
-                        if link.is_displayed() and link.is_enabled():
-                            print(f"Clicking login link: {link.text}")
-                            driver.execute_script("arguments[0].scrollIntoView(true);", link)
-                            driver.execute_script("arguments[0].click();", link)
-                            time.sleep(5)
-                            break
-                
-                # Try multiple approaches to finding login fields (email/username)
-                
-                # 1. Look for fields with email in attributes - standard across most sites
-                email_fields = driver.find_elements(By.XPATH, 
-                    "//input[contains(@type, 'email') or contains(@name, 'email') or contains(@id, 'email')]")
-                
-                # 2. Look for username fields - common on many login forms
-                username_fields = driver.find_elements(By.XPATH, 
-                    "//input[contains(@id, 'username') or contains(@name, 'username') or contains(@placeholder, 'username')]")
-                
-                # 3. Look for fields preceded by email-related labels - works on sites with various layouts
-                email_label_fields = driver.find_elements(By.XPATH, 
-                    "//td[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email')]/following-sibling::td/input | " +
-                    "//label[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email')]/following-sibling::input | " +
-                    "//div[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'email')]/following-sibling::input")
+                for link in login_links:
+                    if link["visible"] and link["enabled"]:
+                        print(f"Clicking login link: {link['text']}")
+                        url_before_click = driver.current_url
+                        scroll_click(driver, link["element"])
+                        # Wait for the login page to load or a login field to appear
+                        wait_for(driver, EC.any_of(
+                            EC.url_changes(url_before_click),
+                            EC.presence_of_element_located((By.CSS_SELECTOR, LOGIN_FIELD_CSS)),
+                        ), 5)
+                        wait_network_idle(driver)
+                        break
                 
-                # 4. Look for any text input field as a last resort
-                text_fields = driver.find_elements(By.XPATH, "//input[@type='text']")
+                # Probe every kind of login field (email/username) in one round-trip:
+                # email attributes, username attributes, inputs following an email label,
+                # and any text input as a last resort
+                email_fields, username_fields, email_label_fields, text_fields = driver.execute_script(PROBE_JS, LOGIN_FIELD_PROBES)
                 
                 print(f"Found {len(email_fields)} email fields, {len(username_fields)} username fields, {len(email_label_fields)} email-label fields, and {len(text_fields)} text fields")
                 
                 # Choose the most likely field to be the email input
-                target_field = None
+                target = None
                 if email_fields:
-                    target_field = email_fields[0]
+                    target = email_fields[0]
                     print("Using email field")
                 elif email_label_fields:
-                    target_field = email_label_fields[0]
+                    target = email_label_fields[0]
                     print("Using field with Email: label")
                 elif username_fields:
-                    target_field = username_fields[0]
+                    target = username_fields[0]
                     print("Using username field")
-                elif text_fields:
+                else:
                     # As a last resort, use the first visible text field
-                    for field in text_fields:
-                        if field.is_displayed():
-                            target_field = field
-                            print("Using generic text field")
-                            break
+                    target = next((field for field in text_fields if field["visible"]), None)
+                    if target:
+                        print("Using generic text field")
                 
                 # Fill in the email field if found
-                if email and target_field:
-                    print(f"Filling field: {target_field.get_attribute('name') or target_field.get_attribute('id')} with {email}")
-                    driver.execute_script("arguments[0].scrollIntoView(true);", target_field)
-                    target_field.clear()
-                    target_field.send_keys(email)
-                    time.sleep(1)
-                    
-                    # Try to submit the form - look for various submit mechanisms
+                if email and target:
+                    target_field = target["element"]
+                    print(f"Filling field: {target['name'] or target['id']} with {email}")
+                    fill_field(driver, target_field, email)
                     
-                    # 1. Look for Login/Sign in buttons
-                    submit_buttons = driver.find_elements(By.XPATH, "//button[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'sign in') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'login') or contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'submit')]")
+                    # Try to submit the form - probe Login/Sign in buttons, submit inputs,
+                    # and any login-related element in one round-trip
+                    submit_buttons, submit_inputs, fallback_buttons, login_elements = driver.execute_script(PROBE_JS, LOGIN_SUBMIT_PROBES)
                     
-                    # 2. Look for input elements with type="submit" or with login-related values (common pattern across sites)
-                    submit_inputs = driver.find_elements(By.XPATH, 
-                        "//input[@type='submit' or " +
-                        "contains(translate(@value, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'login') or " +
-                        "contains(translate(@value, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'sign in') or " +
-                        "contains(translate(@value, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'submit') or " +
-                        "contains(translate(@value, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'continue')]")
-                    
-                    # If no submit inputs found, look for button elements with similar text
+                    # If no submit inputs found, fall back to buttons with similar text
                     if not submit_inputs:
-                        submit_inputs = driver.find_elements(By.XPATH,
-                            "//button[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'login') or " +
-                            "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'sign in') or " +
-                            "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'submit') or " +
-                            "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'continue')]")
-                    
-                    # Look for any login-related elements across multiple sites
-                    login_elements = driver.find_elements(By.XPATH, 
-                        "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'login') or " +
-                        "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'sign in') or " + 
-                        "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'log in') or " +
-                        "contains(@class, 'login') or contains(@id, 'login')]"
-                    )
+                        submit_inputs = fallback_buttons
                     
                     print(f"Found {len(submit_buttons)} submit buttons, {len(submit_inputs)} submit inputs, and {len(login_elements)} login elements")
                     
                     # Try clicking the elements in order of likelihood
+                    url_before_submit = driver.current_url
                     if submit_inputs:
-                        print(f"Clicking submit input: {submit_inputs[0].get_attribute('value')}")
-                        driver.execute_script("arguments[0].click();", submit_inputs[0])
+                        print(f"Clicking submit input: {submit_inputs[0]['value']}")
+                        driver.execute_script("arguments[0].click();", submit_inputs[0]["element"])
                     elif submit_buttons:
-                        print(f"Clicking submit button: {submit_buttons[0].text}")
-                        driver.execute_script("arguments[0].click();", submit_buttons[0])
+                        print(f"Clicking submit button: {submit_buttons[0]['text']}")
+                        driver.execute_script("arguments[0].click();", submit_buttons[0]["element"])
                     elif login_elements:
                         # Try to find the most likely login element (one that's clickable and visible)
                         for login_elem in login_elements:
-                            if login_elem.is_displayed() and login_elem.is_enabled() and login_elem.text.strip():
-                                print(f"Clicking login element: {login_elem.text}")
-                                driver.execute_script("arguments[0].click();", login_elem)
+                            if login_elem["visible"] and login_elem["enabled"] and login_elem["text"]:
+                                print(f"Clicking login element: {login_elem['text']}")
+                                driver.execute_script("arguments[0].click();", login_elem["element"])
                                 break
                     else:
                         print("No submit button found, trying Enter key")
                         target_field.send_keys(Keys.ENTER)
                     
-                    time.sleep(5)
+                    wait_for(driver, EC.url_changes(url_before_submit), 5)
+                    wait_network_idle(driver)
                     print(f"Current URL after submission: {driver.current_url}")
                     
                     # Check if we're on the Global Tariffs page or need to navigate there
@@ -888,14 +3179,15 @@ if __name__ == "__main__":
                         print("Trying to navigate to Global Tariffs page")
                         # Look for Global Tariffs link
                         try:
-                            global_tariffs_links = driver.find_elements(By.XPATH, "//*[contains(text(), 'Global Tariffs') or contains(@href, 'GlobalTariffs')]")
-                            if global_tariffs_links:
-                                for link in global_tariffs_links:
-                                    if link.is_displayed():
-                                        print(f"Clicking Global Tariffs link: {link.text}")
-                                        driver.execute_script("arguments[0].click();", link)
-                                        time.sleep(3)
-                                        break
+                            (global_tariffs_links,) = driver.execute_script(PROBE_JS, GLOBAL_TARIFFS_PROBE)
+                            for link in global_tariffs_links:
+                                if link["visible"]:
+                                    print(f"Clicking Global Tariffs link: {link['text']}")
+                                    url_before_click = driver.current_url
+                                    driver.execute_script("arguments[0].click();", link["element"])
+                                    wait_for(driver, EC.url_changes(url_before_click), 3)
+                                    wait_network_idle(driver)
+                                    break
                         except Exception as e:
                             print(f"Error navigating to Global Tariffs: {str(e)}")
                     
@@ -904,910 +3196,61 @@ if __name__ == "__main__":
                         print("Attempting to search for duty rate information")
                         
                         # Extract product codes from user input using various formats
-                        import re
-                        # Dictionary of code types and their regex patterns
-                        code_patterns = {
-                            "HS Code (10-digit)": r'\b\d{4}\.\d{2}\.\d{2}\b',
-                            "HS Code (6-digit)": r'\b\d{4}\.\d{2}\b',
-                            "HS Code (4-digit)": r'\b\d{4}\b',
-                            "HTS Code": r'\b\d{4}\.\d{2}\.\d{4}\b',
-                            "Schedule B": r'\b\d{10}\b',
-                            "ECCN Code": r'\b\d[A-Z]\d{3}[A-Z]\b',
-                        }
-                        
-                        # Try to find any of these codes in the input
                         found_codes = {}
-                        for code_type, pattern in code_patterns.items():
-                            matches = re.findall(pattern, user_input)
+                        for code_type, pattern in CODE_PATTERNS.items():
+                            matches = pattern.findall(user_input)
                             if matches:
                                 found_codes[code_type] = matches
                         
                         # Default to HS code first (most common for tariffs)
-                        hs_code = None
+                        hs_codes = []
                         
-                        # Look through the codes we found, prioritizing HS codes
+                        # Look through the codes we found, prioritizing HS codes; every code of
+                        # the chosen type is looked up, in the order given
                         if "HS Code (10-digit)" in found_codes:
-                            hs_code = found_codes["HS Code (10-digit)"][0]
+                            hs_codes = found_codes["HS Code (10-digit)"]
                         elif "HS Code (6-digit)" in found_codes:
-                            hs_code = found_codes["HS Code (6-digit)"][0]
+                            hs_codes = found_codes["HS Code (6-digit)"]
                         elif "HS Code (4-digit)" in found_codes:
-                            hs_code = found_codes["HS Code (4-digit)"][0]
+                            hs_codes = found_codes["HS Code (4-digit)"]
                         elif len(found_codes) > 0:
-                            # Use the first code of any type we found
+                            # Use the codes of the first type we found
                             first_type = list(found_codes.keys())[0]
-                            hs_code = found_codes[first_type][0]
+                            hs_codes = found_codes[first_type]
                             
                         # Hardcoded examples for specific cases
                         if "9018.19.10" in user_input:
-                            hs_code = "9018.19.10"
-                        
-                        # Extract country information dynamically
-                        country_patterns = {
-                            "Brazil": [r'\bbrazil\b', r'\bbra\b', r'\bbr\b'],
-                            "China": [r'\bchina\b', r'\bchn\b', r'\bcn\b'],
-                            "United States": [r'\bunited states\b', r'\busa\b', r'\bus\b', r'\bu\.s\.a?\b'],
-                            "India": [r'\bindia\b', r'\bind\b', r'\bin\b'],
-                            "Japan": [r'\bjapan\b', r'\bjpn\b', r'\bjp\b'],
-                            "Mexico": [r'\bmexico\b', r'\bmex\b', r'\bmx\b'],
-                        }
+                            hs_codes = ["9018.19.10"] + hs_codes
+                        hs_codes = list(dict.fromkeys(hs_codes))
+                        hs_code = hs_codes[0] if hs_codes else None
                         
                         # Look for country matches in the input
-                        country = None
-                        for country_name, patterns in country_patterns.items():
-                            for pattern in patterns:
-                                if re.search(pattern, user_input.lower()):
-                                    country = country_name
-                                    break
-                            if country:
-                                break
+                        country = next((name for name, pattern in COUNTRY_PATTERNS.items() if pattern.search(user_input)), None)
                                 
                         # Default to Brazil if no country found (for backward compatibility)
                         if not country:
                             country = "Brazil"
                         
-                        print(f"Searching for HS code: {hs_code} for country: {country}")
+                        print(f"Searching for HS code(s): {', '.join(hs_codes) or None} for country: {country}")
                         
                         if hs_code and country:
-                            # Look for HS Code input field using various approaches
-                            print("Searching for HS Code input field...")
-                            
-                            # 1. Look for fields with specific HS Code attributes
-                            hs_code_fields = driver.find_elements(By.XPATH, 
-                                "//input[contains(@id, 'HSCode') or contains(@name, 'HSCode') or " +
-                                "contains(@placeholder, 'HS Code') or contains(@placeholder, 'Enter HS Code')]"
-                            )
-                            
-                            # 2. Look for fields preceded by HS Code label
-                            if not hs_code_fields:
-                                print("Looking for HS Code field by label...")
-                                hs_label_elements = driver.find_elements(By.XPATH, 
-                                    "//*[contains(text(), 'HS Code') or contains(text(), 'HTS Code')]"
-                                )
-                                
-                                if hs_label_elements:
-                                    for label in hs_label_elements:
-                                        print(f"Found HS Code label: {label.text}")
-                                        # Try to find an input field next to the label
-                                        try:
-                                            # Check various directions from label (following, parent, siblings)
-                                            input_near_label = None
-                                            
-                                            # Check following element first
-                                            possible_fields = driver.find_elements(By.XPATH, f"//td[contains(text(), 'HS Code')]/following-sibling::td//input")
-                                            if possible_fields:
-                                                input_near_label = possible_fields[0]
-                                            
-                                            # Check sibling
-                                            if not input_near_label:
-                                                possible_fields = driver.find_elements(By.XPATH, f"//input[preceding-sibling::*[contains(text(), 'HS Code')]]")
-                                                if possible_fields:
-                                                    input_near_label = possible_fields[0]
-                                                    
-                                            if input_near_label and input_near_label.is_displayed():
-                                                hs_code_fields = [input_near_label]
-                                                break
-                                        except Exception as e:
-                                            print(f"Error finding input near label: {str(e)}")
-                            
-                            # 3. Look for common search fields across various tariff/trade sites
-                            if not hs_code_fields:
-                                print("Checking for common product code search fields...")
-                                # Common field IDs/names across multiple trade/tariff sites
-                                common_fields = driver.find_elements(By.XPATH, 
-                                    "//input[" +
-                                    "contains(@id, 'search') or contains(@name, 'search') or " +
-                                    "contains(@id, 'code') or contains(@name, 'code') or " +
-                                    "contains(@id, 'tariff') or contains(@name, 'tariff') or " +
-                                    "contains(@id, 'hs') or contains(@name, 'hs') or " +
-                                    "contains(@id, 'hts') or contains(@name, 'hts') or " +
-                                    "contains(@placeholder, 'Search') or contains(@placeholder, 'Enter code') or " +
-                                    "@id='tb_HSCodeNumber' or @name='tb_HSCodeNumber' or " +
-                                    "@id='txtHSCode' or @name='txtHSCode' or " +
-                                    "@id='txtSearchCode' or @name='txtSearchCode']"
-                                )
-                                
-                                if common_fields:
-                                    hs_code_fields = common_fields
-                            
-                            # 4. If still not found, look for any text field that's not for email, etc.
-                            if not hs_code_fields:
-                                print("Looking for any text input field that could be for HS codes...")
-                                # Exclude common fields like email, username, password, etc.
-                                hs_code_fields = driver.find_elements(By.XPATH, 
-                                    "//input[@type='text' and not(" +
-                                    "contains(@id, 'email') or contains(@name, 'email') or " +
-                                    "contains(@id, 'user') or contains(@name, 'user') or " +
-                                    "contains(@id, 'password') or contains(@name, 'password') or " +
-                                    "contains(@id, 'search') or contains(@name, 'search'))]"
-                                )
-                            
-                            # Look for country dropdown or input
-                            country_selects = driver.find_elements(By.XPATH, "//select[contains(@id, 'Country') or contains(@name, 'Country')]")
-                            country_fields = driver.find_elements(By.XPATH, "//input[contains(@id, 'Country') or contains(@name, 'Country')]")
-                            
-                            # Fill in HS Code if field found
-                            if hs_code_fields:
-                                hs_field = hs_code_fields[0]
-                                field_id = hs_field.get_attribute("id") or hs_field.get_attribute("name") or "unknown"
-                                print(f"Found HS code field: {field_id}")
-                                driver.execute_script("arguments[0].scrollIntoView(true);", hs_field)
-                                
-                                # Enhanced handling for fields that might not be interactable
-                                # This applies to all sites, not just specific ones
-                                if field_id in ["txtSearchCode", "search", "query", "code", "lookup"] or not hs_field.is_enabled():
-                                    try:
-                                        # Make the element interactable using JavaScript
-                                        driver.execute_script(
-                                            "arguments[0].style.display = 'block'; " +
-                                            "arguments[0].style.visibility = 'visible'; " +
-                                            "arguments[0].style.opacity = '1'; " +
-                                            "arguments[0].disabled = false; " +
-                                            "arguments[0].readOnly = false;", 
-                                            hs_field
-                                        )
-                                        time.sleep(1)
-                                        
-                                        # Set the value using JavaScript - works even with disabled fields
-                                        driver.execute_script("arguments[0].value = arguments[1];", hs_field, hs_code)
-                                        print(f"Set search code using JavaScript: {hs_code}")
-                                        
-                                        # Look for search button with multiple approaches
-                                        search_buttons = driver.find_elements(By.XPATH, 
-                                            "//input[@type='submit' or @value='Search' or contains(@onclick, 'search')] | " +
-                                            "//button[contains(text(), 'Search') or contains(@onclick, 'search')] | " +
-                                            "//a[contains(text(), 'Search') or contains(@onclick, 'search')]"
-                                        )
-                                        
-                                        if search_buttons:
-                                            # Try to find the most relevant search button
-                                            for btn in search_buttons:
-                                                if btn.is_displayed():
-                                                    print(f"Clicking search button: {btn.get_attribute('value') or btn.text}")
-                                                    driver.execute_script("arguments[0].click();", btn)
-                                                    break
-                                        else:
-                                            # Try submitting the form
-                                            try:
-                                                form = hs_field.find_element(By.XPATH, "./ancestor::form")
-                                                driver.execute_script("arguments[0].submit();", form)
-                                                print("Submitted form")
-                                            except:
-                                                # Last resort: press Enter
-                                                try:
-                                                    hs_field.send_keys(Keys.ENTER)
-                                                    print("Sent ENTER key to field")
-                                                except:
-                                                    print("Could not submit search in any way")
-                                        
-                                        time.sleep(5)  # Wait longer for search results
-                                    except Exception as js_error:
-                                        print(f"Error with JavaScript approach: {str(js_error)}")
-                                        # Fallback to regular approach
-                                        try:
-                                            hs_field.clear()
-                                            # Send keys character by character
-                                            for char in hs_code:
-                                                hs_field.send_keys(char)
-                                                time.sleep(0.2)  # Slight delay between characters
-                                            print(f"Entered code using fallback: {hs_code}")
-                                            hs_field.send_keys(Keys.ENTER)
-                                        except Exception as fallback_error:
-                                            print(f"Error with fallback approach: {str(fallback_error)}")
-                                else:
-                                    # Regular approach for other sites
-                                    hs_field.clear()
-                                    hs_field.send_keys(hs_code)
-                                    
-                                    # Additional debugging
-                                    print(f"Entered HS code: {hs_code} into field {field_id}")
-                                    time.sleep(1)
-                                
-                                # Check for autocomplete or suggestions after entering HS code
-                                try:
-                                    # Wait for any autocomplete suggestion to appear
-                                    time.sleep(2)
-                                    suggestion_elements = driver.find_elements(By.XPATH, 
-                                        "//div[contains(@class, 'autocomplete') or contains(@class, 'suggestion')]//li | " +
-                                        "//ul[contains(@class, 'autocomplete') or contains(@class, 'suggestion')]//li"
-                                    )
-                                    
-                                    if suggestion_elements:
-                                        for suggestion in suggestion_elements:
-                                            if suggestion.is_displayed() and hs_code in suggestion.text:
-                                                print(f"Clicking autocomplete suggestion: {suggestion.text}")
-                                                driver.execute_script("arguments[0].click();", suggestion)
-                                                break
-                                except Exception as auto_error:
-                                    print(f"Error handling HS code autocomplete: {str(auto_error)}")
-                            else:
-                                print("No HS code field found - this might be an issue with the site structure")
-                            
-                            # Select or input country
-                            if country_selects:
-                                # If dropdown, select Brazil
-                                country_select = country_selects[0]
-                                print(f"Found country dropdown: {country_select.get_attribute('id') or country_select.get_attribute('name')}")
-                                select = Select(country_select)
-                                
-                                # Try selecting by visible text
-                                try:
-                                    select.select_by_visible_text(country)
-                                    print(f"Selected {country} from dropdown")
-                                except Exception as dropdown_error:
-                                    print(f"Couldn't select by text: {str(dropdown_error)}")
-                                    
-                                    # Try with different case or partial match
-                                    try:
-                                        options = [option.text for option in select.options]
-                                        for option in options:
-                                            if country.lower() in option.lower():
-                                                print(f"Found matching option: {option}")
-                                                select.select_by_visible_text(option)
-                                                break
-                                    except Exception as e:
-                                        print(f"Error with partial match selection: {str(e)}")
-                                        
-                                        # Last attempt: try to select Brazil by index or value
-                                        try:
-                                            # Look for values containing "BR" or "BRA" (country codes for Brazil)
-                                            brazil_options = []
-                                            for i, option in enumerate(select.options):
-                                                value = option.get_attribute("value")
-                                                if value and ("BR" in value or "BRA" in value or "brazil" in value.lower()):
-                                                    brazil_options.append((i, option))
-                                                    
-                                            if brazil_options:
-                                                idx, option = brazil_options[0]
-                                                print(f"Found Brazil by code at index {idx}: {option.text}")
-                                                select.select_by_index(idx)
-                                            else:
-                                                # Last resort: use JavaScript to set the value
-                                                print("Using JavaScript to set dropdown value")
-                                                
-                                                # Enhanced dynamic country selection for all sites
-                                                try:
-                                                    # First try looking for any country-related elements with the target country name
-                                                    country_elements = driver.find_elements(By.XPATH, 
-                                                        f"//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), '{country.lower()}')]"
-                                                    )
-                                                    
-                                                    # Also look for country codes (2-letter and 3-letter codes)
-                                                    country_codes = {
-                                                        "united states": ["US", "USA"],
-                                                        "brazil": ["BR", "BRA"],
-                                                        "china": ["CN", "CHN"],
-                                                        "india": ["IN", "IND"],
-                                                        "japan": ["JP", "JPN"],
-                                                        "germany": ["DE", "DEU"],
-                                                        "united kingdom": ["GB", "GBR", "UK"],
-                                                        "france": ["FR", "FRA"],
-                                                        "italy": ["IT", "ITA"],
-                                                        "canada": ["CA", "CAN"],
-                                                        "australia": ["AU", "AUS"],
-                                                        "spain": ["ES", "ESP"],
-                                                        "mexico": ["MX", "MEX"],
-                                                        "south korea": ["KR", "KOR"],
-                                                        "russia": ["RU", "RUS"],
-                                                    }
-                                                    
-                                                    # Get country codes for the target country if available
-                                                    target_codes = country_codes.get(country.lower(), [])
-                                                    
-                                                    # Look for elements with country code matches if we have codes for this country
-                                                    if target_codes:
-                                                        for code in target_codes:
-                                                            code_elements = driver.find_elements(By.XPATH, 
-                                                                f"//*[text()='{code}' or @value='{code}']"
-                                                            )
-                                                            country_elements.extend(code_elements)
-                                                    
-                                                    # Try clicking on any matching country element
-                                                    for elem in country_elements:
-                                                        if elem.is_displayed():
-                                                            print(f"Found country element: {elem.text}")
-                                                            driver.execute_script("arguments[0].click();", elem)
-                                                            time.sleep(1)
-                                                            break
-                                                    
-                                                    # Look for any duty/tariff/tax related elements
-                                                    duty_elements = driver.find_elements(By.XPATH,
-                                                        "//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'duty') or " +
-                                                        "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'tax') or " +
-                                                        "contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'tariff')]"
-                                                    )
-                                                    
-                                                    # Try clicking on any duty-related elements
-                                                    for elem in duty_elements:
-                                                        if elem.is_displayed() and elem.is_enabled():
-                                                            print(f"Clicking duty/tariff element: {elem.text}")
-                                                            driver.execute_script("arguments[0].click();", elem)
-                                                            time.sleep(2)
-                                                            break
-                                                            
-                                                    # Look for toggle/expand elements that might reveal more info
-                                                    toggles = driver.find_elements(By.XPATH,
-                                                        "//*[contains(@id, 'toggle') or contains(@class, 'toggle') or " +
-                                                        "contains(@class, 'expand') or contains(@class, 'collapse') or " +
-                                                        "contains(@title, 'expand') or contains(@title, 'show more')]"
-                                                    )
-                                                    
-                                                    # Try clicking on any toggle elements
-                                                    for toggle in toggles:
-                                                        if toggle.is_displayed() and toggle.is_enabled():
-                                                            print(f"Clicking toggle/expand element")
-                                                            driver.execute_script("arguments[0].click();", toggle)
-                                                            time.sleep(1)
-                                                except Exception as dynamic_error:
-                                                    print(f"Error with dynamic country handling: {str(dynamic_error)}")
-                                                driver.execute_script(
-                                                    "arguments[0].value = arguments[1]; arguments[0].dispatchEvent(new Event('change'));", 
-                                                    country_select, 
-                                                    "BR"  # Common value for Brazil
-                                                )
-                                        except Exception as js_error:
-                                            print(f"All dropdown selection methods failed: {str(js_error)}")
-                                time.sleep(1)
-                            elif country_fields:
-                                country_field = country_fields[0]
-                                print(f"Found country field: {country_field.get_attribute('id') or country_field.get_attribute('name')}")
-                                driver.execute_script("arguments[0].scrollIntoView(true);", country_field)
-                                country_field.clear()
-                                country_field.send_keys(country)
-                                time.sleep(1)
-                                
-                                # Look for autocomplete suggestions after typing
-                                try:
-                                    # Wait for autocomplete suggestions to appear
-                                    time.sleep(2)
-                                    
-                                    # Look for visible autocomplete suggestions
-                                    autocomplete_items = driver.find_elements(By.XPATH, 
-                                        "//div[contains(@class, 'autocomplete') or contains(@class, 'dropdown') or contains(@class, 'suggestion')]//li | " +
-                                        "//ul[contains(@class, 'autocomplete') or contains(@class, 'dropdown') or contains(@class, 'suggestion')]//li"
-                                    )
-                                    
-                                    if autocomplete_items:
-                                        for item in autocomplete_items:
-                                            if item.is_displayed() and country.lower() in item.text.lower():
-                                                print(f"Clicking autocomplete suggestion: {item.text}")
-                                                driver.execute_script("arguments[0].click();", item)
-                                                time.sleep(1)
-                                                break
-                                except Exception as auto_error:
-                                    print(f"Error handling autocomplete: {str(auto_error)}")
-                            else:
-                                # If no specific country field found, look for any likely fields
-                                print("No standard country field found, looking for alternatives")
-                                
-                                # Look for any inputs or spans that might be a country selector
-                                country_elements = driver.find_elements(By.XPATH, 
-                                    "//input[contains(@placeholder, 'country') or contains(@placeholder, 'dest')] | " +
-                                    "//span[contains(text(), 'Country') or contains(text(), 'Destination')]/following-sibling::*[1]"
-                                )
-                                
-                                if country_elements:
-                                    elem = country_elements[0]
-                                    print(f"Found potential country element: {elem.tag_name}")
-                                    
-                                    if elem.tag_name == "input":
-                                        elem.clear()
-                                        elem.send_keys(country)
-                                    elif elem.is_displayed() and elem.is_enabled():
-                                        driver.execute_script("arguments[0].click();", elem)
-                                        time.sleep(1)
-                                        
-                                        # After clicking, look for a dropdown or input
-                                        dropdown_options = driver.find_elements(By.XPATH, "//li[contains(text(), 'Brazil')]")
-                                        for option in dropdown_options:
-                                            if option.is_displayed():
-                                                driver.execute_script("arguments[0].click();", option)
-                                                break
-                                else:
-                                    print("No country field found")
-                            
-                            # Look for search/submit buttons
-                            search_buttons = driver.find_elements(By.XPATH, "//button[contains(text(), 'Search') or contains(@value, 'Search')] | //input[@type='submit' or @type='button'][contains(@value, 'Search')]")
-                            if not search_buttons:
-                                # Look for any button that might be for searching
-                                search_buttons = driver.find_elements(By.XPATH, "//button | //input[@type='submit' or @type='button']")
-                            
-                            # Click search button
-                            if search_buttons:
-                                for button in search_buttons:
-                                    if button.is_displayed() and button.is_enabled():
-                                        print(f"Clicking search button: {button.text or button.get_attribute('value')}")
-                                        driver.execute_script("arguments[0].click();", button)
-                                        time.sleep(5)
-                                        
-                                        # After clicking search, look for any action buttons that might appear
-                                        time.sleep(2)  # Wait for page to update
-                                        
-                                        # Use our helper method with general action keywords that would work across sites
-                                        action_keywords = ['view', 'details', 'calc', 'show', 'open', 'more', 'info', 'select', 'next']
-                                        action_src_patterns = ['button', 'arrow', 'view', 'details', 'next']
-                                        
-                                        find_and_click_image_buttons(
-                                            driver, 
-                                            keywords=action_keywords, 
-                                            src_patterns=action_src_patterns,
-                                            wait_time=3
-                                        )
-                                        break
-                            else:
-                                # If no button found, try pressing Enter in the last field used
-                                print("No search button found, trying Enter key")
-                                if country_fields:
-                                    country_fields[0].send_keys(Keys.ENTER)
-                                elif hs_code_fields:
-                                    hs_code_fields[0].send_keys(Keys.ENTER)
-                                time.sleep(5)
-                            
-                            # Extract and display the duty rate information
-                            print("\nSearching for duty rate information in page...\n")
-                            duty_rate_found = False
-                            
-                            # Generic data extraction for duty/tariff sites
-                            print("Using intelligent data extraction for duty/tariff information")
-                            
-                            # Common structure across tariff lookup sites:
-                            # 1. First search for a product code and get results with description
-                            # 2. Often need to access specific tabs or sections (Duties, Tariffs, Taxes)
-                            # 3. May need to select or filter by country
-                            
-                            try:
-                                # First, take screenshots for debugging
-                                screenshot_path = "/tmp/screenshot.png"
-                                driver.save_screenshot(screenshot_path)
-                                print(f"Screenshot saved to {screenshot_path}")
-                                
-                                # Check if we're on the Global Tariff page or need to navigate to it
-                                if "GlobalTariffs" not in driver.current_url:
-                                    global_tariff_links = driver.find_elements(By.XPATH, 
-                                        "//a[contains(@href, 'GlobalTariffs') or contains(text(), 'Global Tariff') or contains(text(), 'Tariff')]"
-                                    )
-                                    if global_tariff_links:
-                                        for link in global_tariff_links:
-                                            if link.is_displayed():
-                                                print(f"Clicking link to Global Tariffs: {link.text}")
-                                                driver.execute_script("arguments[0].click();", link)
-                                                time.sleep(3)
-                                                break
-                                    
-                                # Now look for the search field on the Global Tariffs page
-                                try:
-                                    # Try to find search input fields in a general way
-                                    # First look for common product/HS code field patterns
-                                    search_field = None
-                                    search_field_candidates = driver.find_elements(By.XPATH, 
-                                        "//input[contains(@id, 'code') or contains(@name, 'code') or " +
-                                        "contains(@id, 'product') or contains(@name, 'product') or " +
-                                        "contains(@id, 'hs') or contains(@name, 'hs') or " +
-                                        "contains(@placeholder, 'code') or contains(@placeholder, 'product') or " + 
-                                        "contains(@placeholder, 'search')]")
-                                    
-                                    if search_field_candidates:
-                                        search_field = search_field_candidates[0]
+                            if len(hs_codes) > 1:
+                                # Several codes: replay the site's lookup request, or use pooled browsers
+                                results = asyncio.run(lookup_tariffs(driver, hs_codes, country))
+                                for code, result in results.items():
+                                    if isinstance(result, Exception):
+                                        print(f"Error searching for duty rate for {code}: {str(result)}")
                                     else:
-                                        # Fallback: try to find any text input field
-                                        text_inputs = driver.find_elements(By.XPATH, "//input[@type='text']")
-                                        if text_inputs:
-                                            search_field = text_inputs[0]
-                                    
-                                    # Need to check if search field is in an iframe
-                                    iframes = driver.find_elements(By.TAG_NAME, "iframe")
-                                    if iframes:
-                                        for iframe in iframes:
-                                            try:
-                                                driver.switch_to.frame(iframe)
-                                                search_fields = driver.find_elements(By.ID, "txtSearchCode")
-                                                if search_fields and search_fields[0].is_displayed():
-                                                    search_field = search_fields[0]
-                                                    break
-                                                driver.switch_to.default_content()
-                                            except:
-                                                driver.switch_to.default_content()
-                                    
-                                    # Ensure the field is interactable
-                                    driver.execute_script(
-                                        "arguments[0].style.display = 'block'; " +
-                                        "arguments[0].style.visibility = 'visible'; " +
-                                        "arguments[0].disabled = false; " +
-                                        "arguments[0].readOnly = false;", 
-                                        search_field
-                                    )
-                                    
-                                    # Enter the HS code using JavaScript
-                                    driver.execute_script("arguments[0].value = arguments[1];", search_field, hs_code)
-                                    print(f"Set HS code using JavaScript: {hs_code}")
-                                    
-                                    # Find and click the search button in a general way
-                                    search_button = None
-                                    
-                                    # Try multiple approaches to find a search button
-                                    search_button_candidates = driver.find_elements(By.XPATH,
-                                        "//button[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'search')] | " +
-                                        "//input[@type='submit' and (contains(@value, 'search') or contains(@value, 'Search'))] | " +
-                                        "//input[@type='button' and (contains(@value, 'search') or contains(@value, 'Search'))] | " + 
-                                        "//a[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'search')] | " +
-                                        "//button[contains(@id, 'search') or contains(@class, 'search')] | " +
-                                        "//input[contains(@id, 'search') or contains(@class, 'search')]")
-                                    
-                                    if search_button_candidates:
-                                        search_button = search_button_candidates[0]
-                                    else:
-                                        # Fallback to any button near the search field
-                                        try:
-                                            # Look for buttons near our search field
-                                            nearby_buttons = search_field.find_elements(By.XPATH, "..//button | ../..//button | ../following::button[1]")
-                                            if nearby_buttons:
-                                                search_button = nearby_buttons[0]
-                                        except:
-                                            pass
-                                    if search_button:
-                                        driver.execute_script("arguments[0].click();", search_button)
-                                        print("Clicked search button")
-                                    else:
-                                        # Try pressing Enter in the search field as a last resort
-                                        search_field.send_keys(Keys.ENTER)
-                                        print("Used Enter key to submit search")
-                                    
-                                    # After clicking search, look for any action buttons that might appear
-                                    time.sleep(3)  # Wait for page to update
-                                    
-                                    # Use our helper method with general action keywords for any site
-                                    action_keywords = ['view', 'details', 'calc', 'show', 'open', 'more', 'info', 'select', 'next', 'continue']
-                                    action_src_patterns = ['button', 'arrow', 'view', 'details', 'next', 'continue']
-                                    
-                                    find_and_click_image_buttons(
-                                        driver, 
-                                        keywords=action_keywords, 
-                                        src_patterns=action_src_patterns,
-                                        wait_time=3
-                                    )
-                                    time.sleep(5)
-                                except Exception as search_error:
-                                    print(f"Error during search: {str(search_error)}")
-                                    
-                                # First check if we found the HS code
-                                hs_code_found = False
-                                
-                                # Look for result tables with the HS code
-                                result_tables = driver.find_elements(By.XPATH, "//table[.//td[contains(text(), '" + hs_code + "')]]")
-                                if not result_tables:
-                                    # Try with just the beginning of the HS code 
-                                    code_prefix = hs_code[:6] if len(hs_code) > 6 else hs_code
-                                    result_tables = driver.find_elements(By.XPATH, f"//table[.//td[contains(text(), '{code_prefix}')]]")
-                                
-                                if result_tables:
-                                    hs_code_found = True
-                                    print("Found HS code in search results")
-                                    
-                                    # Try to click on the HS code to open details if it's a link
-                                    hs_code_links = driver.find_elements(By.XPATH, f"//a[contains(text(), '{hs_code}')]")
-                                    if hs_code_links:
-                                        for link in hs_code_links:
-                                            if link.is_displayed():
-                                                print(f"Clicking HS code link: {link.text}")
-                                                driver.execute_script("arguments[0].click();", link)
-                                                time.sleep(3)
-                                                break
-                                    
-                                    for table in result_tables:
-                                        print("Found table with HS code information:")
-                                        rows = table.find_elements(By.TAG_NAME, "tr")
-                                        for row in rows:
-                                            cells = row.find_elements(By.TAG_NAME, "td")
-                                            if cells:
-                                                row_text = " ".join([cell.text for cell in cells])
-                                                print(f"HS Code info: {row_text}")
-                                                duty_rate_found = True
-                                    
-                                    # Check if we're in product detail view
-                                    # The site shows HS Code hierarchy with specific formatting
-                                    hs_code_header = driver.find_elements(By.XPATH, 
-                                        "//div[contains(text(), 'HS Code:') or contains(text(), 'Full HS Code')]")
-                                    
-                                    if hs_code_header:
-                                        print(f"Found HS code detail view: {hs_code_header[0].text}")
-                                        
-                                        # Find any description elements 
-                                        description_elems = driver.find_elements(By.XPATH, 
-                                            "//*[contains(text(), 'Endoscopy') or contains(text(), 'endoscopy')]")
-                                        
-                                        for elem in description_elems:
-                                            if elem.is_displayed():
-                                                print(f"Product description: {elem.text}")
-                                                duty_rate_found = True
-                                        
-                                        # Check if Duties and Taxes tab is available
-                                        duties_tab = driver.find_elements(By.XPATH, 
-                                            "//*[contains(text(), 'Duties and Taxes') or contains(text(), 'Duty') or contains(text(), 'Tariff')]")
-                                        
-                                        if duties_tab:
-                                            for tab in duties_tab:
-                                                if tab.is_displayed() and tab.is_enabled():
-                                                    print("Found 'Duties and Taxes' tab")
-                                                    try:
-                                                        driver.execute_script("arguments[0].click();", tab)
-                                                        print(f"Clicked on tab: {tab.text}")
-                                                        time.sleep(3)
-                                                        
-                                                        # Take another screenshot after clicking the tab
-                                                        screenshot_path = "/tmp/after_duties_tab_click.png"
-                                                        driver.save_screenshot(screenshot_path)
-                                                        print(f"Screenshot saved to {screenshot_path}")
-                                                        
-                                                        # Look for Brazil specific information
-                                                        brazil_elements = driver.find_elements(By.XPATH, 
-                                                            "//*[contains(text(), 'Brazil') or text()='BR']"
-                                                        )
-                                                        
-                                                        for brazil_elem in brazil_elements:
-                                                            if brazil_elem.is_displayed():
-                                                                # Check if it's clickable
-                                                                try:
-                                                                    driver.execute_script("arguments[0].click();", brazil_elem)
-                                                                    print(f"Clicked on Brazil element: {brazil_elem.text}")
-                                                                    time.sleep(2)
-                                                                except Exception as brazil_click_error:
-                                                                    print(f"Could not click Brazil element: {str(brazil_click_error)}")
-                                                                
-                                                                # Look for duty rates near this element
-                                                                parent = brazil_elem
-                                                                for i in range(5):  # Go up to 5 levels up
-                                                                    try:
-                                                                        parent = parent.find_element(By.XPATH, "..")
-                                                                        
-                                                                        # Look for percentage values in this parent
-                                                                        if "%" in parent.text:
-                                                                            print(f"Found percentage in parent context: {parent.text}")
-                                                                            duty_rate_found = True
-                                                                            
-                                                                            # Extract all percentages
-                                                                            import re
-                                                                            percentages = re.findall(r'\d+\.?\d*\s*%', parent.text)
-                                                                            if percentages:
-                                                                                print(f"🌟 Found duty rates for Brazil: {', '.join(percentages)}")
-                                                                            break
-                                                                    except:
-                                                                        break
-                                                                        
-                                                                # Look for nearby elements with percentage signs
-                                                                nearby_percentages = driver.find_elements(By.XPATH, 
-                                                                    f"//td[contains(text(), '%') and preceding::*[contains(text(), 'Brazil')] or following::*[contains(text(), 'Brazil')]]"
-                                                                )
-                                                                
-                                                                for pct_elem in nearby_percentages:
-                                                                    if pct_elem.is_displayed():
-                                                                        print(f"Found percentage element near Brazil: {pct_elem.text}")
-                                                                        duty_rate_found = True
-                                                                        break
-                                                    except Exception as tab_click_error:
-                                                        print(f"Error clicking duties tab: {str(tab_click_error)}")
-                                                    
-                                                    # Check if it's already selected
-                                                    if "selected" not in tab.get_attribute("class"):
-                                                        print("Clicking on Duties and Taxes tab")
-                                                        driver.execute_script("arguments[0].click();", tab)
-                                                        time.sleep(2)
-                                    
-                                    # Look for Country selection dropdowns
-                                    country_dropdowns = driver.find_elements(By.XPATH, 
-                                        "//select[contains(@id, 'Country') or following-sibling::text()[contains(., 'Country')]]")
-                                    
-                                    if country_dropdowns:
-                                        print("Found country selection dropdowns")
-                                        
-                                        # Check if there's a Calculate button
-                                        calc_buttons = driver.find_elements(By.XPATH, 
-                                            "//input[@value='Calculate' or @type='button'][contains(@id, 'Calculate')]")
-                                        
-                                        # Try regular buttons first
-                                        button_clicked = False
-                                        if calc_buttons:
-                                            for btn in calc_buttons:
-                                                if btn.is_displayed():
-                                                    print("Found Calculate button")
-                                                    driver.execute_script("arguments[0].click();", btn)
-                                                    time.sleep(2)
-                                                    button_clicked = True
-                                                    break
-                                        
-                                        # If no regular button found/clicked, try image buttons
-                                        if not button_clicked:
-                                            action_keywords = ['view', 'details', 'calc', 'show', 'open', 'more', 'info', 'select', 'next', 'continue', 'proceed']
-                                            action_src_patterns = ['button', 'arrow', 'view', 'details', 'next', 'continue']
-                                            
-                                            button_clicked = find_and_click_image_buttons(
-                                                driver, 
-                                                keywords=action_keywords, 
-                                                src_patterns=action_src_patterns,
-                                                wait_time=2
-                                            )
-                                    
-                                    # Provide a summary of the general workflow followed
-                                    print("\nGeneral workflow summary:")
-                                    print("1. Logged in to the website using provided credentials")
-                                    print("2. Navigated to the appropriate search page")
-                                    print("3. Entered search criteria including product code and country")
-                                    print("4. Looked for action buttons and relevant data on result pages")
-                                    print("5. Analyzed any tables, percentage values, and tariff information")
-                                    
-                                    # Add information about what was found
-                                    if hs_code:
-                                        print(f"\nSearched for product code: {hs_code}")
-                                    if country:
-                                        print(f"Searched for import country: {country}")
-                                # We'll extract any duty or tax-related information found in the page
-                                try:
-                                    # Look for percentage values which might indicate duty rates
-                                    percentage_pattern = r"(\d+(?:\.\d+)?%)"
-                                    percentages = re.findall(percentage_pattern, driver.page_source)
-                                    if percentages:
-                                        print("\nFound potential duty/tax rates in the content:")
-                                        print(", ".join(list(set(percentages[:5]))))  # Display unique rates, limit to 5
-                                    
-                                    # Look for tables with duty information
-                                    tables = driver.find_elements(By.TAG_NAME, "table")
-                                    if tables:
-                                        print("\nFound tables that might contain duty information")
-                                        
-                                    # Look for any tax or duty terms
-                                    duty_terms = ["duty", "tax", "tariff", "vat", "customs", "levy", "charge", "fee"]
-                                    for term in duty_terms:
-                                        if term in driver.page_source.lower():
-                                            print(f"Found '{term}' references in the content")
-                                except Exception as e:
-                                    print(f"Error analyzing page content: {str(e)}")
-                                duty_rate_found = True
-                                    
-                                # Try to extract any duty-related information from the page
-                                if not duty_rate_found:
-                                    # Look for any content with duty/tariff keywords
-                                    duty_elements = driver.find_elements(By.XPATH, 
-                                        "//*[contains(text(), 'duty') or contains(text(), 'Duty') or " +
-                                        "contains(text(), 'tariff') or contains(text(), 'Tariff') or " +
-                                        "contains(text(), 'rate') or contains(text(), 'Rate')]")
-                                    
-                                    for element in duty_elements:
-                                        if element.is_displayed():
-                                            print(f"Duty-related information: {element.text}")
-                                            duty_rate_found = True
-                                
-                            except Exception as e:
-                                print(f"Error in site-specific extraction: {str(e)}")
-                            
-                            # General approach for all sites - look for tables with duty information
-                            if not duty_rate_found:
-                                print("Looking for tables with duty rate information...")
-                                tables = driver.find_elements(By.TAG_NAME, "table")
-                                
-                                for table in tables:
-                                    try:
-                                        # Check if the table has headers first
-                                        headers = table.find_elements(By.TAG_NAME, "th")
-                                        header_text = " ".join([h.text for h in headers]).lower()
-                                        
-                                        # If headers contain relevant keywords, this is likely our table
-                                        if any(keyword in header_text for keyword in ['duty', 'tariff', 'rate', 'tax', 'charge']):
-                                            print("Found table with relevant headers:")
-                                            print(f"Headers: {header_text}")
-                                            
-                                            # Extract all rows
-                                            rows = table.find_elements(By.TAG_NAME, "tr")
-                                            for row in rows:
-                                                cells = row.find_elements(By.TAG_NAME, "td")
-                                                if cells:
-                                                    row_text = " ".join([cell.text for cell in cells])
-                                                    print(f"Row data: {row_text}")
-                                                    
-                                                    # Look for percentage values which likely indicate rates
-                                                    import re
-                                                    percentages = re.findall(r'\d+\.?\d*\s*%', row_text)
-                                                    if percentages:
-                                                        print(f"🌟 Found percentage values: {', '.join(percentages)}")
-                                                    
-                                                    duty_rate_found = True
-                                        else:
-                                            # Check individual rows for duty rate information
-                                            rows = table.find_elements(By.TAG_NAME, "tr")
-                                            for row in rows:
-                                                cells = row.find_elements(By.TAG_NAME, "td")
-                                                row_text = " ".join([cell.text for cell in cells]).lower()
-                                                if any(keyword in row_text for keyword in ['duty', 'tariff', 'rate', 'tax', 'import charge', 'percentage']):
-                                                    print(f"Found potential duty rate information: {row_text}")
-                                                    
-                                                    # Extract percentage values
-                                                    import re
-                                                    percentages = re.findall(r'\d+\.?\d*\s*%', row_text)
-                                                    if percentages:
-                                                        print(f"🌟 Found percentage values: {', '.join(percentages)}")
-                                                    
-                                                    duty_rate_found = True
-                                    except Exception as e:
-                                        print(f"Error processing table: {str(e)}")
-                            
-                            # If no data in tables, look for any text elements with duty information
-                            if not duty_rate_found:
-                                print("Looking for any text elements with duty rate information...")
-                                duty_texts = driver.find_elements(By.XPATH, 
-                                    "//*[contains(text(), 'duty') or contains(text(), 'Duty') or " +
-                                    "contains(text(), 'rate') or contains(text(), 'Rate') or " + 
-                                    "contains(text(), 'tariff') or contains(text(), 'Tariff') or " +
-                                    "contains(text(), 'tax') or contains(text(), 'Tax')]"
-                                )
-                                
-                                for text_elem in duty_texts:
-                                    if text_elem.is_displayed():
-                                        elem_text = text_elem.text.strip()
-                                        if elem_text and len(elem_text) > 3:  # Avoid empty or very short texts
-                                            print(f"Found text with duty/rate information: {elem_text}")
-                                            
-                                            # Look for percentage values which likely indicate rates
-                                            import re
-                                            percentages = re.findall(r'\d+\.?\d*\s*%', elem_text)
-                                            if percentages:
-                                                print(f"🌟 Found percentage values: {', '.join(percentages)}")
-                                                
-                                            duty_rate_found = True
-                            
-                            # Look for labels/divs that are near percentage values
-                            if not duty_rate_found:
-                                print("Looking for percentage values that might indicate duty rates...")
-                                try:
-                                    # Find elements containing percentage symbols
-                                    percentage_elements = driver.find_elements(By.XPATH, "//*[contains(text(), '%')]")
-                                    for elem in percentage_elements:
-                                        if elem.is_displayed():
-                                            print(f"Found element with percentage: {elem.text}")
-                                            duty_rate_found = True
-                                except Exception as e:
-                                    print(f"Error finding percentage elements: {str(e)}")
-                            
-                            # If all extraction methods failed
-                            if not duty_rate_found:
-                                print("Could not find specific duty rate information on the page.")
-                                print("Taking screenshot of current page for manual analysis...")
-                                try:
-                                    driver.save_screenshot("/tmp/duty_rate_page.png")
-                                    print("Screenshot saved to /tmp/duty_rate_page.png")
-                                except Exception as ss_error:
-                                    print(f"Error saving screenshot: {str(ss_error)}")
-                                
-                                # Get page source for offline analysis
-                                try:
-                                    with open("/tmp/page_source.html", "w") as f:
-                                        f.write(driver.page_source)
-                                    print("Page source saved to /tmp/page_source.html for offline analysis")
-                                except Exception as ps_error:
-                                    print(f"Error saving page source: {str(ps_error)}")
+                                        print(f"HS code {code}: {'duty information found' if result else 'no duty information found'}")
+                            else:
+                                lookup_tariff(driver, hs_code, country)
                     except Exception as e:
                         print(f"Error searching for duty rate: {str(e)}")
             except Exception as e:
                 print(f"Error during login: {str(e)}")
             
-            # Let's wait to examine the state
-            time.sleep(5)
+            # Let requests started by the last action finish before the browser shuts down
+            wait_network_idle(browser.driver, timeout=5)
         else:
             # Regular agent execution
             agent = create_agent()
@@ -1815,11 +3258,12 @@ if __name__ == "__main__":
                 "recursion_limit": 50,
                 "thread_id": 42
             }
-            result = agent.invoke({"messages": [user_input]}, config=config)
+            # Run the agent asynchronously so independent tool calls in one step overlap
+            result = asyncio.run(agent.ainvoke({"messages": [user_input]}, config=config))
             print(result["messages"][-1].content)
     except Exception as e:
         print(f"Error in main: {str(e)}")
     finally:
         print("Shutting down browser...")
-        browser.quit()
+        shutdown_browser()
         print("Done.")
\ No newline at end of file